@@ -1,7 +1,6 @@
 import streamlit
 import numpy as np
 import matplotlib.pyplot as plt
-from micrograd.engine import Value
 import long_texts, table_of_contents, introduction
 
 streamlit.set_page_config(layout="wide")
@@ -23,4 +22,10 @@ elif page_name.lower() == 'the chain rule':
     introduction.create_chain_rule_page(sidebar=sidebar)
 
 elif page_name.lower() == 'maximizing/minimizing a function':
-    introduction.create_max_min_concept_derivatives(sidebar=sidebar)
\ No newline at end of file
+    introduction.create_max_min_concept_derivatives(sidebar=sidebar)
+
+elif page_name.lower() == 'building micrograd':
+    introduction.create_building_micrograd_page(sidebar=sidebar)
+
+elif page_name.lower() == 'backpropagation':
+    introduction.create_backpropagation_page(sidebar=sidebar)
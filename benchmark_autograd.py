@@ -0,0 +1,368 @@
+"""Micro-benchmarks for the autograd engines behind the backprop pages.
+
+Times the forward pass, the backward pass and the peak memory of a set of fixed workloads on every engine that is
+available, and writes the results to JSON so that runs from different versions can be diffed:
+
+    python benchmark_autograd.py --output autograd_benchmark.json
+
+With --parallel-backward it also compares the serial tape backward against the thread pool backward of the tensor
+engine on a wide workload.
+"""
+import abc
+import argparse
+import json
+import os
+import platform
+import time
+import tracemalloc
+import numpy as np
+import compact_engine
+import toy_datasets
+from tensor_engine import Tensor, Tape
+from tensor_nn import MLP
+
+try:
+    from micrograd.engine import Value as MicrogradValue
+except ImportError:
+    MicrogradValue = None
+
+WORKLOADS = ('chain', 'neuron', 'mlp2', 'mlp16', 'mlp64', 'moons')
+# micrograd sorts the graph recursively, so the chain has to stay well under the recursion limit (3 nodes per link)
+CHAIN_LENGTH = 200
+MLP_BATCH = 16
+MOONS_SAMPLES = 100
+
+
+###### SCALAR ENGINES ######
+
+def _scalar_mlp(make, nin: int, nouts: list, rng: np.random.Generator) -> tuple:
+    """Builds a micrograd style MLP (ReLU hidden layers, linear output) out of scalar values created with make.
+    Returns the forward function and the list of parameters.
+    """
+    sizes = [nin] + nouts
+    layers = []
+    for i in range(len(nouts)):
+        W = [[make(w) for w in row] for row in rng.uniform(-1, 1, (sizes[i+1], sizes[i])).tolist()]
+        b = [make(0.0) for _ in range(sizes[i+1])]
+        layers.append((W, b, i != len(nouts) - 1))
+
+    def forward(x):
+        for W, b, nonlin in layers:
+            x = [sum((wi * xi for wi, xi in zip(row, x)), bj) for row, bj in zip(W, b)]
+            if nonlin:
+                x = [act.relu() for act in x]
+        return x
+
+    parameters = [p for W, b, _ in layers for row in W + [b] for p in row]
+    return forward, parameters
+
+def _scalar_workload(make, workload: str, rng: np.random.Generator) -> tuple:
+    """Returns (forward, parameters) for a workload on a scalar engine. forward() builds the graph and returns the
+    scalar loss.
+    """
+    if workload == 'chain':
+        x0 = make(0.5)
+        def forward():
+            x = x0
+            for _ in range(CHAIN_LENGTH):
+                x = (x * 0.5 + 0.25).relu()
+            return x
+        return forward, [x0]
+
+    if workload == 'neuron':
+        w = [make(v) for v in rng.uniform(-1, 1, 64).tolist()]
+        b = make(0.0)
+        x = rng.normal(size=64).tolist()
+        def forward():
+            return sum((wi * xi for wi, xi in zip(w, x)), b).relu()
+        return forward, w + [b]
+
+    if workload.startswith('mlp'):
+        width = int(workload[3:])
+        model, parameters = _scalar_mlp(make, 2, [width, width, 1], rng)
+        X = rng.normal(size=(MLP_BATCH, 2)).tolist()
+        y = rng.normal(size=MLP_BATCH).tolist()
+        def forward():
+            return sum((model(xi)[0] - yi)**2 for xi, yi in zip(X, y)) * (1.0 / MLP_BATCH)
+        return forward, parameters
+
+    if workload == 'moons':
+        model, parameters = _scalar_mlp(make, 2, [16, 16, 1], rng)
+        X, y = toy_datasets.make_moons(MOONS_SAMPLES, noise=0.1, rng=rng)
+        X, y = X.tolist(), y.tolist()
+        def forward():
+            # SVM "max-margin" loss plus L2 regularization, as in the micrograd demo
+            losses = [(1 + -yi * model(xi)[0]).relu() for xi, yi in zip(X, y)]
+            data_loss = sum(losses) * (1.0 / len(losses))
+            reg_loss = 1e-4 * sum(p * p for p in parameters)
+            return data_loss + reg_loss
+        return forward, parameters
+
+    raise ValueError(f'unknown workload {workload!r}')
+
+
+###### TENSOR ENGINE ######
+
+def _tensor_workload(workload: str, rng: np.random.Generator) -> tuple:
+    """Returns (forward, parameters) for a workload on the tensor engine."""
+    if workload == 'chain':
+        x0 = Tensor(0.5)
+        def forward():
+            x = x0
+            for _ in range(CHAIN_LENGTH):
+                x = (x * 0.5 + 0.25).relu()
+            return x
+        return forward, [x0]
+
+    if workload == 'neuron':
+        w = Tensor(rng.uniform(-1, 1, (64, 1)))
+        b = Tensor(np.zeros((1, 1)))
+        x = Tensor(rng.normal(size=(1, 64)))
+        def forward():
+            return (x @ w + b).relu().sum()
+        return forward, [w, b]
+
+    if workload.startswith('mlp'):
+        width = int(workload[3:])
+        model = MLP(2, [width, width, 1], rng=rng)
+        X = Tensor(rng.normal(size=(MLP_BATCH, 2)))
+        y = Tensor(rng.normal(size=(MLP_BATCH, 1)))
+        def forward():
+            return ((model(X) - y)**2).mean()
+        return forward, model.parameters()
+
+    if workload == 'moons':
+        model = MLP(2, [16, 16, 1], rng=rng)
+        X, y = toy_datasets.make_moons(MOONS_SAMPLES, noise=0.1, rng=rng)
+        X, y = Tensor(X), Tensor(y.reshape(-1, 1))
+        parameters = model.parameters()
+        def forward():
+            data_loss = (1 + -y * model(X)).relu().mean()
+            reg_loss = 1e-4 * sum((p * p).sum() for p in parameters)
+            return data_loss + reg_loss
+        return forward, parameters
+
+    raise ValueError(f'unknown workload {workload!r}')
+
+
+###### ENGINES ######
+
+class Engine(abc.ABC):
+    """Uniform wrapper around an autograd engine for the benchmark: builds a workload, and knows how to reset
+    gradients and graph state between repetitions. Subclasses must implement setup.
+    """
+    name = ''
+
+    @abc.abstractmethod
+    def setup(self, workload: str, rng: np.random.Generator):
+        """Builds the parameters of a workload and a self._forward() that computes its loss from them."""
+
+    def reset(self):
+        pass
+
+    def forward(self):
+        return self._forward()
+
+    def backward(self, root):
+        root.backward()
+
+
+class MicrogradEngine(Engine):
+    name = 'micrograd'
+
+    def setup(self, workload, rng):
+        self._forward, self.parameters = _scalar_workload(MicrogradValue, workload, rng)
+
+    def reset(self):
+        for p in self.parameters:
+            p.grad = 0
+
+
+class CompactEngine(Engine):
+    name = 'compact'
+
+    def setup(self, workload, rng):
+        self.graph = compact_engine.Graph()
+        self._forward, self.parameters = _scalar_workload(
+            lambda v: compact_engine.Value(v, self.graph), workload, rng
+        )
+        self.n_parameter_nodes = len(self.graph)
+
+    def reset(self):
+        # Graph.backward resets the gradients itself; only the nodes of the previous pass have to go
+        self.graph.clear(keep=self.n_parameter_nodes)
+
+
+class TensorEngine(Engine):
+    name = 'tensor'
+
+    def setup(self, workload, rng):
+        self._forward, self.parameters = _tensor_workload(workload, rng)
+
+    def reset(self):
+        for p in self.parameters:
+            p.zero_grad()
+
+
+def available_engines() -> dict:
+    """Engines that can run in this environment, by name."""
+    engines = [CompactEngine, TensorEngine]
+    if MicrogradValue is not None:
+        engines.insert(0, MicrogradEngine)
+    return {engine.name: engine for engine in engines}
+
+
+###### RUNNER ######
+
+def benchmark(engine: Engine, workload: str, repeat: int = 5, seed: int = 0) -> dict:
+    """Times forward and backward (best of repeat runs) and measures the peak traced memory of one forward plus
+    backward pass of a workload.
+
+    :param engine: Engine to benchmark.
+    :type engine: Engine
+    :param workload: One of WORKLOADS.
+    :type workload: str
+    :param repeat: Number of timed repetitions. Defaults to 5
+    :type repeat: int, optional
+    :param seed: Seed for the parameters and data of the workload. Defaults to 0
+    :type seed: int, optional
+    :return: Dictionary with the engine, the workload, forward_s, backward_s, peak_memory_mb and the final loss.
+    :rtype: dict
+    """
+    engine.setup(workload, np.random.default_rng(seed))
+
+    forward_times, backward_times = [], []
+    for _ in range(repeat):
+        engine.reset()
+        start = time.perf_counter()
+        root = engine.forward()
+        middle = time.perf_counter()
+        engine.backward(root)
+        end = time.perf_counter()
+        forward_times.append(middle - start)
+        backward_times.append(end - middle)
+        del root
+
+    # Traced on a fresh setup, so that the node storage the timed runs already grew (the buffers of CompactEngine's
+    # graph) is allocated again, and counted, during the traced pass
+    engine.setup(workload, np.random.default_rng(seed))
+    tracemalloc.start()
+    root = engine.forward()
+    engine.backward(root)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'engine': engine.name,
+        'workload': workload,
+        'forward_s': min(forward_times),
+        'backward_s': min(backward_times),
+        'peak_memory_mb': peak / 2**20,
+        'loss': float(np.asarray(root.data).reshape(-1)[0]),
+    }
+
+def benchmark_parallel_backward(workers: list, towers: int = 4, width: int = 512, depth: int = 3, batch: int = 256,
+                                repeat: int = 5, seed: int = 0) -> list:
+    """Wall clock time of Tape.backward, serial and on thread pools of several sizes, for an ensemble of independent
+    MLP towers whose outputs are averaged. Every tower and every layer's weight gradient is an independent branch.
+
+    BLAS also multithreads each matmul, so the speedup is largest when BLAS is limited to a few threads (for example
+    OPENBLAS_NUM_THREADS=1) or when the graph has many mid-sized ops.
+
+    :param workers: Thread pool sizes to compare against the serial backward.
+    :type workers: list
+    :param towers: Number of independent towers. Defaults to 4
+    :type towers: int, optional
+    :param width: Width of the hidden layers. Defaults to 512
+    :type width: int, optional
+    :param depth: Number of hidden layers per tower. Defaults to 3
+    :type depth: int, optional
+    :param batch: Minibatch size. Defaults to 256
+    :type batch: int, optional
+    :param repeat: Number of timed repetitions (best one is kept). Defaults to 5
+    :type repeat: int, optional
+    :param seed: Seed for the parameters and data. Defaults to 0
+    :type seed: int, optional
+    :return: One dictionary per configuration with workers (None for serial), backward_s and speedup.
+    :rtype: list
+    """
+    rng = np.random.default_rng(seed)
+    models = [MLP(width, [width] * depth + [1], nonlin='tanh', rng=rng) for _ in range(towers)]
+    X = Tensor(rng.normal(size=(batch, width)))
+    y = Tensor(rng.normal(size=(batch, 1)))
+    loss = sum(((model(X) - y)**2).mean() for model in models) * (1.0 / towers)
+    tape = Tape(loss)
+
+    results = []
+    for n_workers in [None] + list(workers):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            tape.backward(workers=n_workers)
+            times.append(time.perf_counter() - start)
+        results.append({'workers': n_workers, 'backward_s': min(times)})
+    for row in results:
+        row['speedup'] = results[0]['backward_s'] / row['backward_s']
+    return results
+
+def run_suite(engines: list = None, workloads: tuple = WORKLOADS, repeat: int = 5) -> dict:
+    """Runs every workload on every engine.
+
+    :param engines: Names of the engines to run. Defaults to None (every available engine)
+    :type engines: list, optional
+    :param workloads: Workloads to run. Defaults to WORKLOADS
+    :type workloads: tuple, optional
+    :param repeat: Number of timed repetitions per benchmark. Defaults to 5
+    :type repeat: int, optional
+    :return: Dictionary with the environment under 'meta' and one entry per (engine, workload) under 'results'.
+    :rtype: dict
+    """
+    available = available_engines()
+    engines = engines if engines is not None else list(available)
+    results = []
+    for name in engines:
+        if name not in available:
+            raise ValueError(f'engine {name!r} is not available here, choose from {list(available)}')
+        for workload in workloads:
+            results.append(benchmark(available[name](), workload, repeat=repeat))
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default='autograd_benchmark.json', help='JSON file to write the results to')
+    parser.add_argument('--engines', nargs='*', default=None, help='engines to run (default: all available)')
+    parser.add_argument('--workloads', nargs='*', default=list(WORKLOADS), choices=WORKLOADS)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--parallel-backward', action='store_true', help='also benchmark the thread pool backward')
+    parser.add_argument('--workers', nargs='*', type=int, default=None, help='thread pool sizes for --parallel-backward')
+    args = parser.parse_args()
+
+    report = run_suite(args.engines, tuple(args.workloads), args.repeat)
+    for row in report['results']:
+        print(
+            f"{row['engine']:>10} {row['workload']:>7}  forward {row['forward_s'] * 1e3:9.3f} ms"
+            f"  backward {row['backward_s'] * 1e3:9.3f} ms  peak {row['peak_memory_mb']:8.2f} MB"
+        )
+
+    if args.parallel_backward:
+        workers = args.workers or sorted({2, 4, os.cpu_count() or 1})
+        report['meta']['cpu_count'] = os.cpu_count()
+        report['parallel_backward'] = benchmark_parallel_backward(workers, repeat=args.repeat)
+        for row in report['parallel_backward']:
+            print(
+                f"{'serial' if row['workers'] is None else str(row['workers']) + ' threads':>10}"
+                f"  backward {row['backward_s'] * 1e3:9.3f} ms  speedup {row['speedup']:5.2f}x"
+            )
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,234 @@
+"""CPU benchmarks for the Siamese network of phantom_lib.
+
+Times SiameseNetwork.forward with both branches in a single batched pass against the original two passes, at
+several batch sizes, and writes the results to JSON:
+
+    python benchmark_siamese.py --output siamese_benchmark.json
+
+With --inference it also compares the per-batch latency (p50/p99) of calling the model directly against the frozen
+SiameseInference wrapper, with the thread counts given by --intra-op-threads and --inter-op-threads. With
+--quantization it adds siamese_inference.quantization_report for an untrained network on random pairs (latency and
+size are meaningful there; for the accuracy cost, run the report on real validation pairs). With --precision it
+compares fp32 and bf16 autocast side by side: training step and inference throughput, and the activation memory
+saved for the backward pass.
+"""
+import argparse
+import json
+import os
+import platform
+import time
+import torch
+from torch import optim
+from phantom_lib import ContrastiveLoss, SiameseNetwork, PRECISIONS, train_step
+from siamese_inference import IMAGE_SHAPE, SiameseInference, configure_threads, latency_percentiles, quantization_report
+
+BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def _best_time(function, repeat: int, warmup: int = 2) -> float:
+    for _ in range(warmup):
+        function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark_forward(batch_sizes: tuple = BATCH_SIZES, repeat: int = 5, seed: int = 0) -> list:
+    """Times an inference forward of a pair batch, with the two branches in one pass and in two passes.
+
+    :param batch_sizes: Pairs per batch. Defaults to BATCH_SIZES
+    :type batch_sizes: tuple, optional
+    :param repeat: Number of timed repetitions (best one is kept). Defaults to 5
+    :type repeat: int, optional
+    :param seed: Seed for the weights and the inputs. Defaults to 0
+    :type seed: int, optional
+    :return: One dictionary per batch size with two_pass_s, single_pass_s, the pairs per second of each mode, the
+    speedup and the largest absolute difference between the outputs of the two modes.
+    :rtype: list
+    """
+    torch.manual_seed(seed)
+    net = SiameseNetwork().eval()
+    modes = {
+        # Called directly, so that single_pass_max_batch doesn't switch the single pass off at large batch sizes
+        'two_pass': lambda input1, input2: torch.cat([net.forward_once(input1), net.forward_once(input2)]),
+        'single_pass': lambda input1, input2: net.forward_once(torch.cat([input1, input2])),
+    }
+    results = []
+    for batch_size in batch_sizes:
+        input1, input2 = torch.randn(batch_size, *IMAGE_SHAPE), torch.randn(batch_size, *IMAGE_SHAPE)
+        row = {'batch_size': batch_size}
+        outputs = {}
+        with torch.inference_mode():
+            for mode, forward in modes.items():
+                row[f'{mode}_s'] = _best_time(lambda: forward(input1, input2), repeat)
+                row[f'{mode}_pairs_per_s'] = batch_size / row[f'{mode}_s']
+                outputs[mode] = forward(input1, input2)
+        row['speedup'] = row['two_pass_s'] / row['single_pass_s']
+        row['max_abs_diff'] = float((outputs['two_pass'] - outputs['single_pass']).abs().max())
+        results.append(row)
+    return results
+
+
+def benchmark_inference(batch_sizes: tuple = (1, 8, 32), n_calls: int = 100, seed: int = 0) -> list:
+    """Per-batch latency of an eval mode SiameseNetwork called directly, as a training script would, against the
+    SiameseInference wrapper.
+
+    :param batch_sizes: Pairs per batch. Defaults to (1, 8, 32)
+    :type batch_sizes: tuple, optional
+    :param n_calls: Timed calls per batch size and mode. Defaults to 100
+    :type n_calls: int, optional
+    :param seed: Seed for the weights and the inputs. Defaults to 0
+    :type seed: int, optional
+    :return: One dictionary per (batch size, mode) with the latency percentiles of latency_percentiles.
+    :rtype: list
+    """
+    torch.manual_seed(seed)
+    net = SiameseNetwork().eval()
+    inference = SiameseInference(net)
+    results = []
+    for batch_size in batch_sizes:
+        input1, input2 = torch.randn(batch_size, *IMAGE_SHAPE), torch.randn(batch_size, *IMAGE_SHAPE)
+        for mode, forward in (('eager', net), ('inference', inference)):
+            latencies = []
+            for _ in range(2 + n_calls):
+                start = time.perf_counter()
+                forward(input1, input2)
+                latencies.append(time.perf_counter() - start)
+            results.append({'batch_size': batch_size, 'mode': mode, **latency_percentiles(latencies[2:])})
+    return results
+
+
+def _saved_activation_bytes(function) -> int:
+    """Bytes of the tensors autograd saves for the backward pass while function runs."""
+    total = 0
+
+    def pack(tensor):
+        nonlocal total
+        total += tensor.numel() * tensor.element_size()
+        return tensor
+
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+        function()
+    return total
+
+
+def benchmark_precision(batch_size: int = 32, repeat: int = 5, seed: int = 0) -> list:
+    """fp32 against bf16 autocast: pairs per second of a training step (forward, loss, backward and SGD update) and
+    of a frozen SiameseInference call, and the activation memory a training step keeps for the backward pass.
+
+    :param batch_size: Pairs per batch. Defaults to 32
+    :type batch_size: int, optional
+    :param repeat: Number of timed repetitions (best one is kept). Defaults to 5
+    :type repeat: int, optional
+    :param seed: Seed for the weights and the inputs. Defaults to 0
+    :type seed: int, optional
+    :return: One dictionary per precision with train_pairs_per_s, inference_pairs_per_s, activation_mb and the loss
+    of the first step.
+    :rtype: list
+    """
+    results = []
+    for precision in PRECISIONS:
+        torch.manual_seed(seed)
+        net = SiameseNetwork()
+        criterion = ContrastiveLoss()
+        optimizer = optim.SGD(net.parameters(), lr=1e-4)
+        img0, img1 = torch.randn(batch_size, *IMAGE_SHAPE), torch.randn(batch_size, *IMAGE_SHAPE)
+        label = torch.randint(0, 2, (batch_size, 1)).float()
+
+        step = lambda: train_step(net, criterion, optimizer, img0, img1, label, precision=precision)
+        loss = step().item()
+        activation_bytes = _saved_activation_bytes(step)
+        train_s = _best_time(step, repeat)
+        inference = SiameseInference(net, precision=precision)
+        inference_s = _best_time(lambda: inference(img0, img1), repeat)
+        results.append({
+            'precision': precision,
+            'batch_size': batch_size,
+            'loss': loss,
+            'train_pairs_per_s': batch_size / train_s,
+            'inference_pairs_per_s': batch_size / inference_s,
+            'activation_mb': activation_bytes / 2**20,
+        })
+    return results
+
+
+def run_suite(batch_sizes: tuple = BATCH_SIZES, repeat: int = 5) -> dict:
+    """Runs every benchmark.
+
+    :param batch_sizes: Pairs per batch. Defaults to BATCH_SIZES
+    :type batch_sizes: tuple, optional
+    :param repeat: Number of timed repetitions per benchmark. Defaults to 5
+    :type repeat: int, optional
+    :return: Dictionary with the environment under 'meta' and the results of each benchmark.
+    :rtype: dict
+    """
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'torch_threads': torch.get_num_threads(),
+            'repeat': repeat,
+        },
+        'forward': benchmark_forward(batch_sizes, repeat),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default='siamese_benchmark.json', help='JSON file to write the results to')
+    parser.add_argument('--batch-sizes', nargs='*', type=int, default=list(BATCH_SIZES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--inference', action='store_true', help='also benchmark the SiameseInference wrapper')
+    parser.add_argument('--calls', type=int, default=100, help='timed calls per batch size for --inference')
+    parser.add_argument('--quantization', action='store_true', help='also compare fp32 against the int8 fc1')
+    parser.add_argument('--precision', action='store_true', help='also compare fp32 against bf16 autocast')
+    parser.add_argument('--intra-op-threads', type=int, default=None)
+    parser.add_argument('--inter-op-threads', type=int, default=None)
+    args = parser.parse_args()
+
+    configure_threads(args.intra_op_threads, args.inter_op_threads)
+    report = run_suite(tuple(args.batch_sizes), args.repeat)
+    for row in report['forward']:
+        print(
+            f"batch {row['batch_size']:>4}  two passes {row['two_pass_pairs_per_s']:9.1f} pairs/s"
+            f"  single pass {row['single_pass_pairs_per_s']:9.1f} pairs/s  speedup {row['speedup']:5.2f}x"
+        )
+
+    if args.inference:
+        report['inference'] = benchmark_inference(n_calls=args.calls)
+        for row in report['inference']:
+            print(
+                f"batch {row['batch_size']:>4}  {row['mode']:>9}  p50 {row['p50_ms']:8.2f} ms"
+                f"  p99 {row['p99_ms']:8.2f} ms"
+            )
+    if args.quantization:
+        torch.manual_seed(0)
+        pairs = 32
+        report['quantization'] = quantization_report(
+            SiameseNetwork(), torch.randn(pairs, *IMAGE_SHAPE), torch.randn(pairs, *IMAGE_SHAPE),
+            torch.randint(0, 2, (pairs, 1)).float(), n_calls=args.calls
+        )
+        for name in ('fp32', 'int8'):
+            row = report['quantization'][name]
+            print(
+                f"{name:>5}  loss {row['loss']:.6f}  size {row['size_bytes'] / 2**20:6.2f} MB"
+                f" (fc1 {row['fc1_size_bytes'] / 2**20:5.2f} MB)  p50 {row['p50_ms']:8.2f} ms  p99 {row['p99_ms']:8.2f} ms"
+            )
+        drift = report['quantization']['distance_drift']
+        print(f"distance drift  mean {drift['mean_abs']:.2e}  max {drift['max_abs']:.2e}  relative {drift['mean_relative']:.2%}")
+    if args.precision:
+        report['precision'] = benchmark_precision(repeat=args.repeat)
+        for row in report['precision']:
+            print(
+                f"{row['precision']:>5}  train {row['train_pairs_per_s']:8.1f} pairs/s"
+                f"  inference {row['inference_pairs_per_s']:8.1f} pairs/s  activations {row['activation_mb']:7.1f} MB"
+                f"  loss {row['loss']:.6f}"
+            )
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
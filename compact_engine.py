@@ -0,0 +1,358 @@
+import contextlib
+import json
+import math
+import mmap
+import struct
+import threading
+from array import array
+
+# Op codes stored in Graph.op. The exponent of a POW node is kept in Graph.arg.
+LEAF, ADD, MUL, POW, TANH, RELU, EXP = range(7)
+OP_NAMES = ('', '+', '*', '**', 'tanh', 'ReLU', 'exp')
+
+# Buffers of a Graph with their array typecodes, in the order save_graph writes them (8-byte types first, so that
+# every section of the file stays aligned)
+_BUFFERS = (('data', 'd'), ('arg', 'd'), ('lhs', 'i'), ('rhs', 'i'), ('op', 'B'))
+_MAGIC = b'CGRAPH01'
+_HEADER = struct.Struct('<8sQQQ') # magic, number of nodes, offset and length of the JSON names section
+_HEADER_SIZE = 64
+
+
+class Graph:
+    """Struct-of-arrays store for scalar computation graphs. Node i lives at position i of flat typed buffers (value,
+    gradient, op code, the indices of its two parents and an optional float argument), around 33 bytes per node
+    instead of the few hundred a micrograd Value with its dict, set and closure needs.
+
+    Nodes are appended in the order they are created, and a node can only be created from nodes that already exist,
+    so the creation order is already a topological order. backward() is therefore a plain loop over integer indices.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        """
+        :param capacity: Number of nodes to preallocate. The buffers double in size whenever they fill up.
+        :type capacity: int
+        """
+        self.size = 0
+        self.capacity = 0
+        self.data = array('d')
+        self.grad = array('d')
+        self.op = array('B')
+        self.lhs = array('i')
+        self.rhs = array('i')
+        self.arg = array('d')
+        self._grow(max(capacity, 1))
+
+    def _grow(self, extra: int):
+        if not isinstance(self.data, array):
+            # Buffers mapped from a file by load_graph can't grow: copy them into arrays first
+            for name, code in _BUFFERS:
+                buffer = array(code)
+                buffer.frombytes(getattr(self, name).cast('B'))
+                setattr(self, name, buffer)
+        self.data.extend(array('d', bytes(8 * extra)))
+        self.grad.extend(array('d', bytes(8 * extra)))
+        self.op.extend(array('B', bytes(extra)))
+        self.lhs.extend(array('i', [-1]) * extra)
+        self.rhs.extend(array('i', [-1]) * extra)
+        self.arg.extend(array('d', bytes(8 * extra)))
+        self.capacity += extra
+
+    def add_node(self, data: float, op: int = LEAF, lhs: int = -1, rhs: int = -1, arg: float = 0.0) -> int:
+        """Appends a node to the graph and returns its index.
+
+        :param data: Value of the node.
+        :type data: float
+        :param op: Op code that produced the node, LEAF for inputs and parameters. Defaults to LEAF
+        :type op: int, optional
+        :param lhs: Index of the first parent, -1 if there is none. Defaults to -1
+        :type lhs: int, optional
+        :param rhs: Index of the second parent, -1 if there is none. Defaults to -1
+        :type rhs: int, optional
+        :param arg: Extra argument of the op (the exponent for POW). Defaults to 0.0
+        :type arg: float, optional
+        :return: Index of the new node.
+        :rtype: int
+        """
+        i = self.size
+        if i == self.capacity:
+            self._grow(max(self.capacity, 1))
+        self.data[i] = data
+        self.grad[i] = 0.0
+        self.op[i] = op
+        self.lhs[i] = lhs
+        self.rhs[i] = rhs
+        self.arg[i] = arg
+        self.size = i + 1
+        return i
+
+    def backward(self, root: int):
+        """Backpropagates from node root. Resets the gradients of every node up to root first, so this is
+        micrograd's zero_grad() followed by backward().
+
+        :param root: Index of the output node.
+        :type root: int
+        """
+        data, grad, op, lhs, rhs, arg = self.data, self.grad, self.op, self.lhs, self.rhs, self.arg
+        grad[0:root + 1] = array('d', bytes(8 * (root + 1)))
+        grad[root] = 1.0
+        for i in range(root, -1, -1):
+            g = grad[i]
+            code = op[i]
+            if code == LEAF or g == 0.0:
+                continue
+            a = lhs[i]
+            if code == ADD:
+                grad[a] += g
+                grad[rhs[i]] += g
+            elif code == MUL:
+                b = rhs[i]
+                grad[a] += data[b] * g
+                grad[b] += data[a] * g
+            elif code == POW:
+                p = arg[i]
+                grad[a] += p * data[a]**(p - 1) * g
+            elif code == TANH:
+                grad[a] += (1 - data[i]**2) * g
+            elif code == RELU:
+                if data[i] > 0:
+                    grad[a] += g
+            elif code == EXP:
+                grad[a] += data[i] * g
+
+    def clear(self, keep: int = 0):
+        """Forgets every node but the first keep ones, and keeps the allocated buffers. Handles to forgotten nodes
+        become invalid. Creating the parameters first and calling clear(keep=len(graph)) after each training step
+        resets the graph without losing them.
+
+        :param keep: Number of nodes to keep. Defaults to 0
+        :type keep: int, optional
+        """
+        self.size = keep
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the node buffers, in bytes."""
+        return sum(buffer.itemsize * len(buffer) for buffer in (self.data, self.grad, self.op, self.lhs, self.rhs, self.arg))
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return f"Graph(nodes={self.size}, capacity={self.capacity})"
+
+
+def _sections(size: int) -> list:
+    """(name, typecode, offset, nbytes) of every buffer in a saved graph of size nodes."""
+    sections, offset = [], _HEADER_SIZE
+    for name, code in _BUFFERS:
+        nbytes = array(code).itemsize * size
+        sections.append((name, code, offset, nbytes))
+        offset += (nbytes + 7) // 8 * 8
+    return sections
+
+def save_graph(graph: Graph, path: str, names: dict = None):
+    """Writes a graph to a compact binary file: a 64 byte header, the values, op arguments, parent indices and op
+    codes of the nodes as flat arrays, and a JSON section that maps names to node indices (the output, the inputs...).
+    Gradients are not saved.
+
+    :param graph: Graph to save.
+    :type graph: Graph
+    :param path: File to write.
+    :type path: str
+    :param names: Name -> Value (or node index) of the nodes that have to be found again after loading. Defaults to None
+    :type names: dict, optional
+    """
+    size = graph.size
+    names = {name: getattr(v, 'idx', v) for name, v in (names or {}).items()}
+    sections = _sections(size)
+    names_offset = sections[-1][2] + sections[-1][3]
+    names_bytes = json.dumps(names).encode()
+
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, size, names_offset, len(names_bytes)).ljust(_HEADER_SIZE, b'\0'))
+        for name, _, offset, nbytes in sections:
+            f.seek(offset)
+            f.write(memoryview(getattr(graph, name))[:size].tobytes())
+        f.seek(names_offset)
+        f.write(names_bytes)
+
+def load_graph(path: str) -> tuple:
+    """Memory-maps a graph written by save_graph. The node buffers are views straight into the mapped file (nothing is
+    copied or parsed), so loading is instant, and processes that load the same file share its pages through the OS
+    cache. The mapping is copy-on-write: changing the value of a node only affects this process, never the file.
+    Only the gradients get a fresh buffer.
+
+    :param path: File written by save_graph.
+    :type path: str
+    :raises ValueError: If the file is not a saved graph, or is truncated or corrupt.
+    :return: Tuple (graph, names), names mapping every saved name to a Value of the loaded graph.
+    :rtype: tuple
+    """
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    if len(mapped) < _HEADER_SIZE:
+        raise ValueError(f'{path} is not a saved graph')
+    magic, size, names_offset, names_length = _HEADER.unpack_from(mapped)
+    if magic != _MAGIC:
+        raise ValueError(f'{path} is not a saved graph')
+    # Checked before any slicing: a short slice would fail in cast with a TypeError, or silently map fewer nodes
+    sections = _sections(size)
+    sections_end = sections[-1][2] + sections[-1][3]
+    if names_offset < sections_end or names_offset + names_length > len(mapped):
+        raise ValueError(
+            f'{path} is truncated or corrupt: the header describes {names_offset + names_length} bytes, '
+            f'the file has {len(mapped)}'
+        )
+
+    graph = Graph.__new__(Graph)
+    view = memoryview(mapped)
+    for name, code, offset, nbytes in sections:
+        setattr(graph, name, view[offset:offset + nbytes].cast(code))
+    graph.grad = array('d', bytes(8 * size))
+    graph.size = graph.capacity = size
+
+    names = json.loads(bytes(view[names_offset:names_offset + names_length]))
+    if any(not 0 <= idx < size for idx in names.values()):
+        raise ValueError(f'{path} is corrupt: a saved name points past the {size} nodes of the graph')
+    return graph, {name: Value._from_node(graph, idx) for name, idx in names.items()}
+
+
+# Default graphs are per thread: a Graph isn't safe to grow from several threads at once, and streamlit runs every
+# session on its own thread. _local.stack holds the graphs of the nested graph_scope blocks of the thread.
+_local = threading.local()
+
+def default_graph() -> Graph:
+    """Graph that Values are added to when no graph is given explicitly: the graph of the innermost graph_scope of the
+    current thread or, outside of any scope, a graph owned by the thread. That one is only freed with the thread, so
+    code that keeps running (a server, a long training loop) should build its Values inside graph_scope or pass a
+    graph explicitly.
+
+    :return: The current default graph.
+    :rtype: Graph
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        return stack[-1]
+    if not hasattr(_local, 'graph'):
+        _local.graph = Graph()
+    return _local.graph
+
+@contextlib.contextmanager
+def graph_scope(graph: Graph = None):
+    """Makes graph the default graph of the current thread inside a with block. Once the block exits, the graph is
+    no longer referenced by the module, and it is freed with the last Value that points to it.
+
+    :param graph: Graph to add Values to. Defaults to None (a new Graph)
+    :type graph: Graph, optional
+    :return: Context manager yielding the graph.
+    :rtype: contextlib.AbstractContextManager
+    """
+    graph = graph if graph is not None else Graph()
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    _local.stack.append(graph)
+    try:
+        yield graph
+    finally:
+        _local.stack.pop()
+
+
+class Value:
+    """Thin handle to a node of a Graph, with the same semantics as micrograd's Value. The handle only holds the graph
+    and an index; the value, gradient and parents live in the graph's buffers.
+    """
+    __slots__ = ('graph', 'idx')
+
+    def __init__(self, data: float, graph: Graph = None):
+        self.graph = graph if graph is not None else default_graph()
+        self.idx = self.graph.add_node(data)
+
+    @classmethod
+    def _from_node(cls, graph: Graph, idx: int) -> "Value":
+        out = object.__new__(cls)
+        out.graph = graph
+        out.idx = idx
+        return out
+
+    def _new(self, data: float, op: int, lhs: int, rhs: int = -1, arg: float = 0.0) -> "Value":
+        return Value._from_node(self.graph, self.graph.add_node(data, op, lhs, rhs, arg))
+
+    def _coerce(self, other) -> "Value":
+        if isinstance(other, Value):
+            assert other.graph is self.graph, "cannot combine Values that live in different graphs"
+            return other
+        return Value(other, self.graph)
+
+    @property
+    def data(self) -> float:
+        return self.graph.data[self.idx]
+
+    @data.setter
+    def data(self, value: float):
+        self.graph.data[self.idx] = value
+
+    @property
+    def grad(self) -> float:
+        return self.graph.grad[self.idx]
+
+    @grad.setter
+    def grad(self, value: float):
+        self.graph.grad[self.idx] = value
+
+    @property
+    def _op(self) -> str:
+        return OP_NAMES[self.graph.op[self.idx]]
+
+    @property
+    def _prev(self) -> tuple:
+        graph = self.graph
+        return tuple(Value._from_node(graph, i) for i in (graph.lhs[self.idx], graph.rhs[self.idx]) if i >= 0)
+
+    def __add__(self, other):
+        other = self._coerce(other)
+        return self._new(self.data + other.data, ADD, self.idx, other.idx)
+
+    def __mul__(self, other):
+        other = self._coerce(other)
+        return self._new(self.data * other.data, MUL, self.idx, other.idx)
+
+    def __pow__(self, other):
+        assert isinstance(other, (int, float)), "only supporting int/float powers for now"
+        return self._new(self.data**other, POW, self.idx, arg=other)
+
+    def tanh(self):
+        return self._new(math.tanh(self.data), TANH, self.idx)
+
+    def relu(self):
+        x = self.data
+        return self._new(x if x > 0 else 0.0, RELU, self.idx)
+
+    def exp(self):
+        return self._new(math.exp(self.data), EXP, self.idx)
+
+    def backward(self):
+        self.graph.backward(self.idx)
+
+    def __neg__(self): # -self
+        return self * -1
+
+    def __radd__(self, other): # other + self
+        return self + other
+
+    def __sub__(self, other): # self - other
+        return self + (-other)
+
+    def __rsub__(self, other): # other - self
+        return other + (-self)
+
+    def __rmul__(self, other): # other * self
+        return self * other
+
+    def __truediv__(self, other): # self / other
+        return self * other**-1
+
+    def __rtruediv__(self, other): # other / self
+        return other * self**-1
+
+    def __repr__(self):
+        return f"Value(data={self.data}, grad={self.grad})"
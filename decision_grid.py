@@ -0,0 +1,192 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def parameter_version(parameters: list) -> str:
+    """Fingerprint of the current values of a model's parameters: it changes after every training step and is the
+    same for two models with the same weights.
+
+    :param parameters: Parameter Tensors (anything with a NumPy .data).
+    :type parameters: list
+    :return: Hex digest of the parameter values.
+    :rtype: str
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for p in parameters:
+        digest.update(np.ascontiguousarray(p.data).tobytes())
+    return digest.hexdigest()
+
+
+def _lattice(n: int, step: int) -> np.ndarray:
+    """Indices 0, step, 2*step... of a size n axis, always including the last one."""
+    lattice = np.arange(0, n, step)
+    return lattice if lattice[-1] == n - 1 else np.append(lattice, n - 1)
+
+def _interpolation_matrix(n: int, lattice: np.ndarray) -> np.ndarray:
+    """(n, len(lattice)) matrix of the linear interpolation weights of every index of a size n axis."""
+    cell = np.clip(np.searchsorted(lattice, np.arange(n), side='right') - 1, 0, len(lattice) - 2)
+    t = (np.arange(n) - lattice[cell]) / (lattice[cell + 1] - lattice[cell])
+    weights = np.zeros((n, len(lattice)))
+    weights[np.arange(n), cell] = 1 - t
+    weights[np.arange(n), cell + 1] += t
+    return weights
+
+def _interpolate(values: np.ndarray, rows: np.ndarray, cols: np.ndarray, shape: tuple) -> np.ndarray:
+    """Bilinear interpolation of values known on the lattice rows x cols to every point of the grid."""
+    return _interpolation_matrix(shape[0], rows) @ values @ _interpolation_matrix(shape[1], cols).T
+
+
+def refine_grid(predict, xs: np.ndarray, ys: np.ndarray, coarse_step: int = 16) -> tuple:
+    """Scores of a classifier on the grid xs x ys, evaluated coarse to fine. The grid is first sampled every
+    coarse_step points. A cell of the lattice whose four corners get the same class is filled by bilinear
+    interpolation of the corner scores; only cells whose corners disagree, i.e. that the decision boundary crosses,
+    are split in four and sampled at half the step, down to single points. The number of evaluations grows with the
+    length of the boundary instead of the area of the grid.
+
+    A class region smaller than a coarse cell that doesn't touch any lattice point can be missed, so coarse_step
+    should stay below the size of the smallest feature of the boundary.
+
+    :param predict: Maps points of shape (n, 2) to scores of shape (n,), positive for class 1.
+    :type predict: callable
+    :param xs: Grid coordinates along x, shape (n_cols,).
+    :type xs: np.ndarray
+    :param ys: Grid coordinates along y, shape (n_rows,).
+    :type ys: np.ndarray
+    :param coarse_step: Spacing of the first lattice, in grid points. Rounded down to a power of 2. Defaults to 16
+    :type coarse_step: int, optional
+    :return: Tuple (scores with shape (n_rows, n_cols), number of points evaluated).
+    :rtype: tuple
+    """
+    shape = (len(ys), len(xs))
+    scores = np.zeros(shape)
+    known = np.zeros(shape, dtype=bool)
+    filled = np.zeros(shape, dtype=bool)
+    n_evaluated = 0
+    if min(shape) < 2:
+        points = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+        return predict(points).reshape(shape), len(points)
+
+    step = 2**int(np.log2(max(coarse_step, 1)))
+    active = None
+    while True:
+        rows, cols = _lattice(shape[0], step), _lattice(shape[1], step)
+        if active is None:
+            active = np.ones((max(len(rows) - 1, 1), max(len(cols) - 1, 1)), dtype=bool)
+
+        # Corners of the active cells that haven't been evaluated yet
+        corners = np.zeros((len(rows), len(cols)), dtype=bool)
+        corners[:-1, :-1] |= active[:len(rows) - 1, :len(cols) - 1]
+        corners[1:, :-1] |= active[:len(rows) - 1, :len(cols) - 1]
+        corners[:-1, 1:] |= active[:len(rows) - 1, :len(cols) - 1]
+        corners[1:, 1:] |= active[:len(rows) - 1, :len(cols) - 1]
+        r, c = np.nonzero(corners)
+        r, c = rows[r], cols[c]
+        new = ~known[r, c]
+        r, c = r[new], c[new]
+        if len(r):
+            scores[r, c] = predict(np.stack([xs[c], ys[r]], axis=1))
+            known[r, c] = True
+            n_evaluated += len(r)
+
+        lattice_scores = scores[np.ix_(rows, cols)]
+        if len(rows) < 2 or len(cols) < 2 or step == 1:
+            break
+        positive = lattice_scores > 0
+        corner_count = positive[:-1, :-1].astype(int) + positive[1:, :-1] + positive[:-1, 1:] + positive[1:, 1:]
+        mixed = active & (corner_count % 4 != 0)
+        uniform = active & ~mixed
+
+        # Fill the points of the uniform cells from their corners
+        cell_r = np.clip(np.searchsorted(rows, np.arange(shape[0]), side='right') - 1, 0, len(rows) - 2)
+        cell_c = np.clip(np.searchsorted(cols, np.arange(shape[1]), side='right') - 1, 0, len(cols) - 2)
+        fill = uniform[np.ix_(cell_r, cell_c)] & ~known & ~filled
+        if fill.any():
+            scores[fill] = _interpolate(lattice_scores, rows, cols, shape)[fill]
+            filled |= fill
+
+        # Children of the mixed cells are the active cells of the next, finer lattice
+        step //= 2
+        child_rows, child_cols = _lattice(shape[0], step), _lattice(shape[1], step)
+        parent_r = np.clip(np.searchsorted(rows, child_rows[:-1], side='right') - 1, 0, len(rows) - 2)
+        parent_c = np.clip(np.searchsorted(cols, child_cols[:-1], side='right') - 1, 0, len(cols) - 2)
+        active = mixed[np.ix_(parent_r, parent_c)]
+        if not active.any():
+            break
+
+    return scores, n_evaluated
+
+
+class DecisionGrid:
+    """Decision boundary evaluator for a fixed region and resolution. The grid is split into square tiles that are
+    refined independently (see refine_grid) and cached by (parameter version, tile), so redrawing the boundary of a
+    model that hasn't changed since the last draw costs nothing, and only the tiles of a new version are evaluated.
+
+    One DecisionGrid can be shared by several threads (e.g. streamlit sessions): the cache and the counters are
+    guarded by a lock, which is not held while a tile is refined.
+    """
+
+    def __init__(self, bounds: tuple, resolution: int = 500, tile_size: int = 64, coarse_step: int = 16,
+                 max_tiles: int = 1024):
+        """
+        :param bounds: (x_min, x_max, y_min, y_max) of the grid.
+        :type bounds: tuple
+        :param resolution: Points along each axis. Defaults to 500
+        :type resolution: int, optional
+        :param tile_size: Points along each side of a tile. Defaults to 64
+        :type tile_size: int, optional
+        :param coarse_step: Spacing of the first lattice inside a tile. Defaults to 16
+        :type coarse_step: int, optional
+        :param max_tiles: Number of tiles kept in the cache, least recently used ones are dropped. Defaults to 1024
+        :type max_tiles: int, optional
+        """
+        x_min, x_max, y_min, y_max = bounds
+        self.xs = np.linspace(x_min, x_max, resolution)
+        self.ys = np.linspace(y_min, y_max, resolution)
+        self.tile_size = tile_size
+        self.coarse_step = coarse_step
+        self.max_tiles = max_tiles
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evaluations = 0
+
+    def _tile(self, predict, version, row: int, col: int) -> np.ndarray:
+        key = (version, row, col)
+        with self._lock:
+            tile = self._tiles.get(key) if version is not None else None
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                self.hits += 1
+                return tile
+            self.misses += 1
+        rows = slice(row * self.tile_size, (row + 1) * self.tile_size)
+        cols = slice(col * self.tile_size, (col + 1) * self.tile_size)
+        tile, n_evaluated = refine_grid(predict, self.xs[cols], self.ys[rows], self.coarse_step)
+        with self._lock:
+            self.evaluations += n_evaluated
+            if version is not None:
+                self._tiles[key] = tile
+                self._tiles.move_to_end(key)
+                while len(self._tiles) > self.max_tiles:
+                    self._tiles.popitem(last=False)
+        return tile
+
+    def evaluate(self, predict, version: str = None) -> np.ndarray:
+        """Scores of the model on the whole grid.
+
+        :param predict: Maps points of shape (n, 2) to scores of shape (n,), positive for class 1.
+        :type predict: callable
+        :param version: Version of the model's parameters, e.g. parameter_version(model.parameters()). Defaults to
+        None (nothing is cached)
+        :type version: str, optional
+        :return: Scores with shape (resolution, resolution); rows follow y and columns follow x.
+        :rtype: np.ndarray
+        """
+        n_rows = -(-len(self.ys) // self.tile_size)
+        n_cols = -(-len(self.xs) // self.tile_size)
+        return np.block([
+            [self._tile(predict, version, row, col) for col in range(n_cols)] for row in range(n_rows)
+        ])
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import threading
+import numpy as np
+from compact_engine import Graph, Value, save_graph, load_graph
+
+# Prebuilt graphs are written here the first time they are asked for, then every session just maps the file
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.graph_cache')
+# Part of the file names: bump it when a builder or the compact_engine file format changes, so that graphs saved by
+# an older version are rebuilt instead of reused
+EXAMPLES_VERSION = 1
+# Streamlit sessions are threads of one process: only one of them builds a missing graph
+_build_lock = threading.Lock()
+
+
+def build_expression() -> tuple:
+    """The expression L = (a*b + c) * f from the micrograd lecture, with a=2, b=-3, c=10 and f=-2.
+
+    :return: Tuple (graph, names).
+    :rtype: tuple
+    """
+    graph = Graph(16)
+    a, b, c, f = (Value(x, graph) for x in (2.0, -3.0, 10.0, -2.0))
+    e = a * b
+    d = e + c
+    L = d * f
+    return graph, {'a': a, 'b': b, 'c': c, 'e': e, 'd': d, 'f': f, 'L': L}
+
+
+def build_neuron() -> tuple:
+    """A 2-input tanh neuron, o = tanh(x1*w1 + x2*w2 + b), with the bias that makes o = 0.7071 as in the lecture.
+
+    :return: Tuple (graph, names).
+    :rtype: tuple
+    """
+    graph = Graph(16)
+    x1, x2, w1, w2, b = (Value(x, graph) for x in (2.0, 0.0, -3.0, 1.0, 6.8813735870195432))
+    n = x1 * w1 + x2 * w2 + b
+    o = n.tanh()
+    return graph, {'x1': x1, 'x2': x2, 'w1': w1, 'w2': w2, 'b': b, 'n': n, 'o': o}
+
+
+def build_mlp_loss(seed: int = 0) -> tuple:
+    """Squared error loss of a 3-4-4-1 tanh MLP on the four examples of the lecture. The parameters are named p0, p1...
+    in the order weights then bias, neuron by neuron and layer by layer.
+
+    :param seed: Seed of the weight initialization. Defaults to 0
+    :type seed: int, optional
+    :return: Tuple (graph, names).
+    :rtype: tuple
+    """
+    rng = np.random.default_rng(seed)
+    graph = Graph(1024)
+    sizes = [3, 4, 4, 1]
+    layers = [
+        [([Value(w, graph) for w in rng.uniform(-1, 1, nin)], Value(rng.uniform(-1, 1), graph)) for _ in range(nout)]
+        for nin, nout in zip(sizes, sizes[1:])
+    ]
+    parameters = [p for layer in layers for ws, b in layer for p in ws + [b]]
+
+    xs = [[2.0, 3.0, -1.0], [3.0, -1.0, 0.5], [0.5, 1.0, 1.0], [1.0, 1.0, -1.0]]
+    ys = [1.0, -1.0, -1.0, 1.0]
+    loss = Value(0.0, graph)
+    for x, y in zip(xs, ys):
+        out = x
+        for layer in layers:
+            out = [sum((wi * xi for wi, xi in zip(ws, out)), b).tanh() for ws, b in layer]
+        loss = loss + (out[0] - y)**2
+
+    names = {f'p{i}': p for i, p in enumerate(parameters)}
+    names['loss'] = loss
+    return graph, names
+
+
+EXAMPLES = {
+    'expression': build_expression,
+    'neuron': build_neuron,
+    'mlp_loss': build_mlp_loss,
+}
+# Name of the output node of every example
+OUTPUTS = {'expression': 'L', 'neuron': 'o', 'mlp_loss': 'loss'}
+
+
+def example_path(name: str, directory: str = CACHE_DIR) -> str:
+    """File of a prebuilt example graph, built and saved the first time it is asked for, or again if the file was
+    deleted since.
+
+    :param name: Key of EXAMPLES.
+    :type name: str
+    :param directory: Directory of the saved graphs. Defaults to CACHE_DIR
+    :type directory: str, optional
+    :return: Path of the saved graph.
+    :rtype: str
+    """
+    path = os.path.join(directory, f'{name}.v{EXAMPLES_VERSION}.graph')
+    if os.path.exists(path):
+        return path
+    with _build_lock:
+        if not os.path.exists(path):
+            os.makedirs(directory, exist_ok=True)
+            graph, names = EXAMPLES[name]()
+            # Written under a unique temporary name and renamed, so that another process building the same graph
+            # never maps a half-written file
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+            os.close(fd)
+            try:
+                save_graph(graph, tmp_path, names)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+    return path
+
+
+def load_example_graph(name: str, directory: str = CACHE_DIR) -> tuple:
+    """Loads a prebuilt example graph. Every call maps the file again, so each caller gets its own copy-on-write graph
+    that it can change (and backpropagate through) without affecting the other sessions.
+
+    :param name: Key of EXAMPLES: 'expression', 'neuron' or 'mlp_loss'.
+    :type name: str
+    :param directory: Directory of the saved graphs. Defaults to CACHE_DIR
+    :type directory: str, optional
+    :return: Tuple (graph, names), names mapping the names of the example to Values of the graph.
+    :rtype: tuple
+    """
+    return load_graph(example_path(name, directory))
@@ -0,0 +1,75 @@
+import numpy as np
+import forward_mode
+
+SCHEMES = ('forward', 'central', 'richardson', 'complex_step')
+
+
+def difference_estimates(f, x, h, schemes: tuple = SCHEMES) -> dict:
+    """Estimates f'(x) with several finite difference schemes for every combination of x and h. All the real
+    evaluation points are stacked into a single array, so f is called once for the real schemes (and once more, on
+    complex input, for the complex step).
+
+    - forward: (f(x + h) - f(x)) / h, error O(h)
+    - central: (f(x + h) - f(x - h)) / 2h, error O(h^2)
+    - richardson: (4 * central(h/2) - central(h)) / 3, error O(h^4)
+    - complex_step: Im(f(x + ih)) / h, error O(h^2) and no cancellation, so h can go down to 1e-200
+
+    :param f: Vectorized function of one variable. The complex step needs f to accept complex arrays.
+    :type f: callable
+    :param x: Points in which to differentiate, shape (nx,).
+    :type x: np.array
+    :param h: Step sizes, shape (nh,).
+    :type h: np.array
+    :param schemes: Schemes to compute. Defaults to all of SCHEMES
+    :type schemes: tuple, optional
+    :return: Dictionary scheme -> array of estimates with shape (nx, nh).
+    :rtype: dict
+    """
+    x = np.asarray(x, dtype=np.float64).reshape(-1, 1)
+    h = np.asarray(h, dtype=np.float64).reshape(1, -1)
+    X, H = np.broadcast_arrays(x, h)
+
+    # Offsets (in units of h) at which each real scheme needs f
+    offsets = {'forward': (0, 1), 'central': (-1, 1), 'richardson': (-1, -0.5, 0.5, 1)}
+    needed = sorted({o for scheme in schemes if scheme in offsets for o in offsets[scheme]})
+
+    estimates = {}
+    if needed:
+        points = np.stack([X + o * H for o in needed])
+        values = dict(zip(needed, f(points)))
+        central = lambda step: (values[step] - values[-step]) / (2 * step * H)
+        if 'forward' in schemes:
+            estimates['forward'] = (values[1] - values[0]) / H
+        if 'central' in schemes:
+            estimates['central'] = central(1)
+        if 'richardson' in schemes:
+            estimates['richardson'] = (4 * central(0.5) - central(1)) / 3
+    if 'complex_step' in schemes:
+        estimates['complex_step'] = np.imag(f(X + 1j * H)) / H
+    return estimates
+
+
+def difference_errors(f, x, h, exact=None, schemes: tuple = SCHEMES) -> dict:
+    """Absolute error of every finite difference scheme over the whole (x, h) grid. This is the error surface used to
+    show truncation error (large h) and round-off error (small h) side by side.
+
+    :param f: Vectorized function of one variable.
+    :type f: callable
+    :param x: Points in which to differentiate, shape (nx,).
+    :type x: np.array
+    :param h: Step sizes, shape (nh,).
+    :type h: np.array
+    :param exact: Exact derivative at x. Defaults to None, in which case it is computed with forward_mode.
+    :type exact: np.array or None, optional
+    :param schemes: Schemes to compute. Defaults to all of SCHEMES
+    :type schemes: tuple, optional
+    :return: Dictionary scheme -> array of absolute errors with shape (nx, nh).
+    :rtype: dict
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if exact is None:
+        _, exact = forward_mode.derivative(f, x)
+    exact = np.asarray(exact, dtype=np.float64).reshape(-1, 1)
+
+    estimates = difference_estimates(f, x, h, schemes)
+    return {scheme: np.abs(estimate - exact) for scheme, estimate in estimates.items()}
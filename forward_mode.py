@@ -0,0 +1,124 @@
+import numpy as np
+
+
+class Dual:
+    """Dual number a + b*eps (eps**2 = 0) over NumPy arrays. Evaluating a function on Dual(x, 1) carries the exact
+    first derivative along in the tangent, element by element, so a whole grid of x values is differentiated in a
+    single vectorized pass.
+
+    Functions written with Python operators or NumPy ufuncs (np.exp, np.sin, ...) work unchanged.
+    """
+
+    def __init__(self, primal, tangent=None):
+        self.primal = np.asarray(primal, dtype=np.float64)
+        self.tangent = np.zeros_like(self.primal) if tangent is None else np.asarray(tangent, dtype=np.float64)
+
+    def __add__(self, other):
+        other = other if isinstance(other, Dual) else Dual(other)
+        return Dual(self.primal + other.primal, self.tangent + other.tangent)
+
+    def __mul__(self, other):
+        other = other if isinstance(other, Dual) else Dual(other)
+        return Dual(self.primal * other.primal, self.tangent * other.primal + self.primal * other.tangent)
+
+    def __truediv__(self, other):
+        other = other if isinstance(other, Dual) else Dual(other)
+        return Dual(
+            self.primal / other.primal,
+            (self.tangent * other.primal - self.primal * other.tangent) / other.primal**2
+        )
+
+    def __pow__(self, other):
+        if isinstance(other, Dual):
+            # d(u^v) = u^v * (v' * log(u) + v * u' / u)
+            return (other * self.log()).exp()
+        return Dual(self.primal**other, other * self.primal**(other - 1) * self.tangent)
+
+    def __rpow__(self, other): # other ** self
+        return (self * np.log(other)).exp()
+
+    def exp(self):
+        e = np.exp(self.primal)
+        return Dual(e, e * self.tangent)
+
+    def log(self):
+        return Dual(np.log(self.primal), self.tangent / self.primal)
+
+    def sqrt(self):
+        s = np.sqrt(self.primal)
+        return Dual(s, self.tangent / (2 * s))
+
+    def sin(self):
+        return Dual(np.sin(self.primal), np.cos(self.primal) * self.tangent)
+
+    def cos(self):
+        return Dual(np.cos(self.primal), -np.sin(self.primal) * self.tangent)
+
+    def tanh(self):
+        t = np.tanh(self.primal)
+        return Dual(t, (1 - t**2) * self.tangent)
+
+    def relu(self):
+        return Dual(np.maximum(self.primal, 0), (self.primal > 0) * self.tangent)
+
+    def __neg__(self): # -self
+        return Dual(-self.primal, -self.tangent)
+
+    def __radd__(self, other): # other + self
+        return self + other
+
+    def __sub__(self, other): # self - other
+        return self + (-other)
+
+    def __rsub__(self, other): # other - self
+        return other + (-self)
+
+    def __rmul__(self, other): # other * self
+        return self * other
+
+    def __rtruediv__(self, other): # other / self
+        return Dual(other) / self
+
+    _UFUNCS = {
+        np.add: lambda a, b: a + b,
+        np.subtract: lambda a, b: a - b,
+        np.multiply: lambda a, b: a * b,
+        np.true_divide: lambda a, b: a / b,
+        np.power: lambda a, b: a ** b,
+        np.negative: lambda a: -a,
+        np.exp: lambda a: a.exp(),
+        np.log: lambda a: a.log(),
+        np.sqrt: lambda a: a.sqrt(),
+        np.sin: lambda a: a.sin(),
+        np.cos: lambda a: a.cos(),
+        np.tanh: lambda a: a.tanh(),
+    }
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        # Lets np.exp(d), np.sin(d) or np_array * d dispatch to the dual rules above
+        if method != '__call__' or kwargs or ufunc not in self._UFUNCS:
+            return NotImplemented
+        inputs = [x if isinstance(x, Dual) else Dual(x) for x in inputs]
+        return self._UFUNCS[ufunc](*inputs)
+
+    def __repr__(self):
+        return f"Dual(primal={self.primal}, tangent={self.tangent})"
+
+
+def derivative(f, x) -> tuple:
+    """Evaluates f and its exact first derivative at every point of x in one forward pass.
+
+    :param f: Function of one variable built from arithmetic operators and NumPy ufuncs, e.g.
+    plotting_functions.test_parabola.
+    :type f: callable
+    :param x: Point or grid of points in which to evaluate the derivative.
+    :type x: float or np.array
+    :return: Tuple (f(x), f'(x)) with the shape of x.
+    :rtype: tuple
+    """
+    x = np.asarray(x, dtype=np.float64)
+    out = f(Dual(x, np.ones_like(x)))
+    if not isinstance(out, Dual):
+        # f does not depend on x
+        return np.broadcast_to(np.asarray(out, dtype=np.float64), x.shape), np.zeros_like(x)
+    return out.primal, out.tangent
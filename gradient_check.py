@@ -0,0 +1,143 @@
+import numpy as np
+import compact_engine
+from tensor_engine import Tape
+
+
+def relative_error(analytic: np.ndarray, numerical: np.ndarray, floor: float = 1e-10) -> np.ndarray:
+    """Elementwise |analytic - numerical| / max(|analytic|, |numerical|), with the denominator kept above floor so that
+    two gradients that are both (almost) zero don't report a huge error.
+
+    :param analytic: Gradient computed by backpropagation.
+    :type analytic: np.ndarray
+    :param numerical: Gradient estimated with finite differences.
+    :type numerical: np.ndarray
+    :param floor: Smallest denominator. Defaults to 1e-10
+    :type floor: float, optional
+    :return: Relative errors with the shape of the inputs.
+    :rtype: np.ndarray
+    """
+    scale = np.maximum(np.maximum(np.abs(analytic), np.abs(numerical)), floor)
+    return np.abs(analytic - numerical) / scale
+
+
+def check_gradients(loss, parameters: list, eps: float = 1e-6, chunk_size: int = 64) -> list:
+    """Compares the gradients that backward() gives for a tensor_engine graph against central differences for every
+    entry of every parameter. Instead of one forward pass per perturbation, chunk_size entries are perturbed at once:
+    each perturbed parameter gets an extra leading batch axis with one row per +eps/-eps perturbation, and the graph
+    is replayed once on the batched leaves.
+
+    Leaves the analytic gradients in the .grad of the parameters.
+
+    :param loss: Scalar Tensor at the end of the graph.
+    :type loss: Tensor
+    :param parameters: Leaf Tensors to check.
+    :type parameters: list
+    :param eps: Step of the central differences. Defaults to 1e-6
+    :type eps: float, optional
+    :param chunk_size: Number of entries perturbed in the same forward pass; bounds the memory used. Defaults to 64
+    :type chunk_size: int, optional
+    :return: One array of relative errors per parameter, with the shape of the parameter. Take .max() of each one
+    for the per-parameter report.
+    :rtype: list
+    """
+    tape = Tape(loss)
+    tape.forward()
+    tape.backward()
+    analytic = [p.grad.copy() for p in parameters]
+
+    originals = [p.data for p in parameters]
+    sizes = [data.size for data in originals]
+    offsets = np.cumsum([0] + sizes)
+    # Batched leaves are padded so that the batch axis sits in front of every axis used in the graph
+    depth = max(v.data.ndim for v in tape.nodes)
+
+    numerical = np.empty(offsets[-1])
+    try:
+        for start in range(0, offsets[-1], chunk_size):
+            stop = min(start + chunk_size, offsets[-1])
+            n = stop - start
+            for k, p in enumerate(parameters):
+                lo, hi = max(start, offsets[k]), min(stop, offsets[k + 1])
+                if lo >= hi:
+                    p.data = originals[k]
+                    continue
+                batched = np.repeat(originals[k].reshape(1, -1), 2 * n, axis=0)
+                rows = np.arange(lo, hi) - start
+                cols = np.arange(lo, hi) - offsets[k]
+                batched[rows, cols] += eps
+                batched[rows + n, cols] -= eps
+                shape = originals[k].shape
+                p.data = batched.reshape((2 * n,) + (1,) * (depth - len(shape)) + shape)
+            tape.forward()
+            values = loss.data.reshape(2 * n)
+            numerical[start:stop] = (values[:n] - values[n:]) / (2 * eps)
+    finally:
+        for p, data in zip(parameters, originals):
+            p.data = data
+        tape.forward()
+
+    return [
+        relative_error(grad, numerical[offsets[k]:offsets[k + 1]].reshape(grad.shape))
+        for k, grad in enumerate(analytic)
+    ]
+
+
+def check_compact_gradients(root, leaves: list, eps: float = 1e-6, max_bytes: int = 2**28) -> np.ndarray:
+    """Same check for a compact_engine graph. The graph is re-evaluated node by node, but every node holds a vector
+    with one entry per +eps/-eps perturbation, so all the leaves are checked in a handful of passes (as many as fit
+    in max_bytes).
+
+    Leaves the analytic gradients in the graph.
+
+    :param root: Scalar output of the graph.
+    :type root: compact_engine.Value
+    :param leaves: Leaf Values to check.
+    :type leaves: list
+    :param eps: Step of the central differences. Defaults to 1e-6
+    :type eps: float, optional
+    :param max_bytes: Memory budget for the batched node values. Defaults to 256 MB
+    :type max_bytes: int, optional
+    :return: Relative error of every leaf, in the order of leaves.
+    :rtype: np.ndarray
+    """
+    graph = root.graph
+    n_nodes = root.idx + 1
+    graph.backward(root.idx)
+    leaf_index = np.array([v.idx for v in leaves], dtype=np.int64)
+    analytic = np.array([graph.grad[i] for i in leaf_index])
+
+    data = np.frombuffer(graph.data, dtype=np.float64, count=n_nodes)
+    op = np.frombuffer(graph.op, dtype=np.uint8, count=n_nodes)
+    lhs = np.frombuffer(graph.lhs, dtype=np.int32, count=n_nodes)
+    rhs = np.frombuffer(graph.rhs, dtype=np.int32, count=n_nodes)
+    arg = np.frombuffer(graph.arg, dtype=np.float64, count=n_nodes)
+
+    chunk_size = max(1, min(len(leaves), max_bytes // (16 * n_nodes)))
+    numerical = np.empty(len(leaves))
+    for start in range(0, len(leaves), chunk_size):
+        chunk = leaf_index[start:start + chunk_size]
+        n = len(chunk)
+        vals = np.repeat(data.reshape(-1, 1), 2 * n, axis=1)
+        rows = np.arange(n)
+        vals[chunk, rows] += eps
+        vals[chunk, rows + n] -= eps
+        for i in range(n_nodes):
+            code = op[i]
+            if code == compact_engine.LEAF:
+                continue
+            a = vals[lhs[i]]
+            if code == compact_engine.ADD:
+                vals[i] = a + vals[rhs[i]]
+            elif code == compact_engine.MUL:
+                vals[i] = a * vals[rhs[i]]
+            elif code == compact_engine.POW:
+                vals[i] = a**arg[i]
+            elif code == compact_engine.TANH:
+                vals[i] = np.tanh(a)
+            elif code == compact_engine.RELU:
+                vals[i] = np.maximum(a, 0)
+            elif code == compact_engine.EXP:
+                vals[i] = np.exp(a)
+        numerical[start:start + n] = (vals[root.idx, :n] - vals[root.idx, n:]) / (2 * eps)
+
+    return relative_error(analytic, numerical)
@@ -0,0 +1,212 @@
+import numpy as np
+from tensor_engine import Tensor
+
+# Scalar op names that close a neuron, mapped to the Tensor method that does the same on a whole layer
+ACTIVATIONS = {'ReLU': 'relu', 'tanh': 'tanh'}
+
+
+def _node_key(v) -> object:
+    """Identity of a scalar node. compact_engine handles are recreated on every access, so they are identified by
+    their graph and index; micrograd Values by the object itself.
+    """
+    if hasattr(v, 'idx'):
+        return (id(v.graph), v.idx)
+    return id(v)
+
+
+def _sum_terms(v) -> list:
+    """Flattens a chain of '+' nodes into the list of terms being added.
+    """
+    terms = []
+    stack = [v]
+    while stack:
+        node = stack.pop()
+        if node._op == '+':
+            stack.extend(node._prev)
+        else:
+            terms.append(node)
+    return terms
+
+
+class FusedLayer:
+    """One fully connected layer recovered from the scalar graph. W and b are Tensors; w_index and b_index hold, for
+    every entry of W and b, the position of the scalar parameter it came from.
+    """
+
+    def __init__(self, W: np.ndarray, b: np.ndarray, w_index: np.ndarray, b_index: np.ndarray, activation: str):
+        self.W = Tensor(W)
+        self.b = Tensor(b)
+        self.w_index = w_index
+        self.b_index = b_index
+        self.activation = activation
+
+    def __call__(self, x: Tensor) -> Tensor:
+        act = x @ self.W + self.b
+        if self.activation is not None:
+            act = getattr(act, self.activation)()
+        return act
+
+    def __repr__(self):
+        return f"FusedLayer({self.W.shape[0]}, {self.W.shape[1]}, activation={self.activation})"
+
+
+class FusedMLP:
+    """Matrix-op program equivalent to a scalar-built MLP. Runs a whole minibatch through each layer with one
+    matmul on the tensor engine, and maps values and gradients back to the scalar parameters it was traced from.
+    """
+
+    def __init__(self, layers: list, parameters: list):
+        self.layers = layers
+        self.scalar_parameters = parameters
+
+    def __call__(self, X) -> Tensor:
+        x = X if isinstance(X, Tensor) else Tensor(X)
+        for layer in self.layers:
+            x = layer(x)
+        return x
+
+    def parameters(self) -> list:
+        return [p for layer in self.layers for p in (layer.W, layer.b)]
+
+    def zero_grad(self):
+        for p in self.parameters():
+            p.grad = np.zeros_like(p.data)
+
+    def _scatter(self, attribute: str) -> np.ndarray:
+        flat = np.zeros(len(self.scalar_parameters))
+        for layer in self.layers:
+            flat[layer.w_index] = getattr(layer.W, attribute)
+            flat[layer.b_index] = getattr(layer.b, attribute)
+        return flat
+
+    def flat_data(self) -> np.ndarray:
+        """Fused parameter values, in the order of the scalar model's parameters()."""
+        return self._scatter('data')
+
+    def flat_grad(self) -> np.ndarray:
+        """Fused parameter gradients, in the order of the scalar model's parameters()."""
+        return self._scatter('grad')
+
+    def load_parameters(self):
+        """Copies the current values of the scalar parameters into the fused matrices.
+        """
+        values = np.array([p.data for p in self.scalar_parameters], dtype=np.float64)
+        for layer in self.layers:
+            layer.W.data = values[layer.w_index]
+            layer.b.data = values[layer.b_index]
+
+    def store_parameters(self, grads: bool = True):
+        """Writes the fused values (and gradients) back into the scalar parameters, so the pages can keep showing
+        the scalar model after training on the fused one.
+
+        :param grads: Whether to also copy the gradients. Defaults to True
+        :type grads: bool, optional
+        """
+        values = self.flat_data()
+        gradients = self.flat_grad() if grads else None
+        for i, p in enumerate(self.scalar_parameters):
+            p.data = float(values[i])
+            if grads:
+                p.grad = float(gradients[i])
+
+    def __repr__(self):
+        return f"FusedMLP of [{', '.join(str(layer) for layer in self.layers)}]"
+
+
+def _make_inputs(parameters: list, n_inputs: int) -> list:
+    """Creates fresh scalar input nodes of the same kind as the parameters (and in the same graph for compact_engine).
+    """
+    cls = type(parameters[0])
+    if hasattr(parameters[0], 'graph'):
+        return [cls(0.0, parameters[0].graph) for _ in range(n_inputs)]
+    return [cls(0.0) for _ in range(n_inputs)]
+
+
+def trace_mlp(model, n_inputs: int) -> FusedMLP:
+    """Runs one forward pass of a scalar-built network (micrograd's MLP, or anything built the same way out of
+    micrograd or compact_engine Values) and recovers its layers: every neuron must be a bias plus one weight * input
+    product per input of its layer, optionally followed by ReLU or tanh, and the inputs of a layer must be either
+    the network inputs or the neurons of the layer below.
+
+    :param model: Scalar model with a parameters() method, called with a list of n_inputs scalar Values.
+    :type model: callable
+    :param n_inputs: Number of inputs of the network.
+    :type n_inputs: int
+    :raises ValueError: If the traced graph is not a stack of dense layers.
+    :return: The fused matrix-op program, loaded with the current parameter values.
+    :rtype: FusedMLP
+    """
+    parameters = model.parameters()
+    param_position = {_node_key(p): i for i, p in enumerate(parameters)}
+
+    inputs = _make_inputs(parameters, n_inputs)
+    outputs = model(inputs)
+    outputs = outputs if isinstance(outputs, (list, tuple)) else [outputs]
+
+    # Walk back from the outputs, one layer at a time, until every neuron reads from the network inputs
+    input_keys = {_node_key(x): j for j, x in enumerate(inputs)}
+    layers = []
+    current = outputs
+    while True:
+        neurons = []
+        for out in current:
+            activation = ACTIVATIONS.get(out._op)
+            pre = next(iter(out._prev)) if activation is not None else out
+            weights, bias = [], -1
+            for term in _sum_terms(pre):
+                key = _node_key(term)
+                if key in param_position:
+                    if bias != -1:
+                        raise ValueError('a neuron can only have one bias parameter')
+                    bias = param_position[key]
+                    continue
+                if term._op != '*':
+                    raise ValueError(f'unexpected {term._op!r} node inside a neuron')
+                factors = list(term._prev)
+                if len(factors) != 2:
+                    raise ValueError('weight * input products need two different operands')
+                if _node_key(factors[1]) in param_position:
+                    factors.reverse()
+                if _node_key(factors[0]) not in param_position:
+                    raise ValueError('every product in a neuron must involve a parameter')
+                weights.append((param_position[_node_key(factors[0])], factors[1]))
+            neurons.append((weights, bias, activation))
+
+        # The inputs of this layer are whatever the products multiply by, in first-seen order
+        layer_inputs, layer_input_keys = [], {}
+        for weights, _, _ in neurons:
+            for _, x in weights:
+                key = _node_key(x)
+                if key not in layer_input_keys:
+                    layer_input_keys[key] = len(layer_inputs)
+                    layer_inputs.append(x)
+        reads_network_inputs = all(key in input_keys for key in layer_input_keys)
+        if reads_network_inputs:
+            layer_input_keys = input_keys
+
+        activations = {activation for _, _, activation in neurons}
+        if len(activations) != 1:
+            raise ValueError('all neurons of a layer must share the same activation')
+
+        w_index = np.full((len(layer_input_keys), len(neurons)), -1, dtype=np.int64)
+        b_index = np.full((1, len(neurons)), -1, dtype=np.int64)
+        for k, (weights, bias, _) in enumerate(neurons):
+            for position, x in weights:
+                w_index[layer_input_keys[_node_key(x)], k] = position
+            b_index[0, k] = bias
+        if (w_index < 0).any() or (b_index < 0).any():
+            raise ValueError('every neuron needs a bias and one weight per input of its layer')
+        layers.append((w_index, b_index, activations.pop()))
+
+        if reads_network_inputs:
+            break
+        # The neurons of the layer below are parsed in the order this layer reads them, so its outputs line up
+        current = layer_inputs
+
+    layers.reverse()
+    fused = FusedMLP(
+        [FusedLayer(np.zeros(w.shape), np.zeros(b.shape), w, b, activation) for w, b, activation in layers],
+        parameters
+    )
+    fused.load_parameters()
+    return fused
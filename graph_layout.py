@@ -0,0 +1,178 @@
+import hashlib
+import functools
+import numpy as np
+import compact_engine
+
+# Number of barycenter sweeps (down then up) used to untangle the edges between consecutive ranks
+ORDERING_SWEEPS = 4
+
+
+class GraphLayout:
+    """Positions of the nodes of a computation graph, drawn left to right like micrograd's draw_dot: inputs on the
+    left, the output on the right.
+
+    When the graph has more nodes than can be drawn, nodes are grouped by column and op ("level of detail"): each
+    displayed node then stands for several graph nodes, and each edge for several graph edges.
+    """
+
+    def __init__(self, key: str, group: np.ndarray, ops: list, counts: np.ndarray, x: np.ndarray, y: np.ndarray,
+                 edges: np.ndarray, edge_counts: np.ndarray, collapsed: bool):
+        """
+        :param key: Digest of the graph structure, stable across reruns.
+        :type key: str
+        :param group: Displayed node of every graph node up to the root, -1 for nodes the root doesn't depend on.
+        :type group: np.ndarray
+        :param ops: Op name of every displayed node.
+        :type ops: list
+        :param counts: Number of graph nodes behind every displayed node.
+        :type counts: np.ndarray
+        :param x: Column of every displayed node.
+        :type x: np.ndarray
+        :param y: Position of every displayed node inside its column.
+        :type y: np.ndarray
+        :param edges: (source, target) displayed nodes of every displayed edge, shape (n_edges, 2).
+        :type edges: np.ndarray
+        :param edge_counts: Number of graph edges behind every displayed edge.
+        :type edge_counts: np.ndarray
+        :param collapsed: Whether nodes were grouped.
+        :type collapsed: bool
+        """
+        self.key = key
+        self.group = group
+        self.ops = ops
+        self.counts = counts
+        self.x = x
+        self.y = y
+        self.edges = edges
+        self.edge_counts = edge_counts
+        self.collapsed = collapsed
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __repr__(self):
+        return f"GraphLayout(nodes={len(self)}, edges={len(self.edges)}, collapsed={self.collapsed})"
+
+
+def _ranks(op: np.ndarray, lhs: np.ndarray, rhs: np.ndarray, reachable: np.ndarray) -> np.ndarray:
+    """Column of every node: longest path from the inputs, with every leaf moved right next to its first consumer
+    (a weight of the second layer of an MLP sits by the second layer, not with the inputs)."""
+    rank = np.zeros(len(op), dtype=np.int64)
+    for i in np.flatnonzero(reachable & (op != compact_engine.LEAF)).tolist():
+        r = rank[lhs[i]]
+        if rhs[i] >= 0 and rank[rhs[i]] > r:
+            r = rank[rhs[i]]
+        rank[i] = r + 1
+
+    first_use = np.full(len(op), np.iinfo(np.int64).max)
+    inner = reachable & (op != compact_engine.LEAF)
+    for parents in (lhs, rhs):
+        has_parent = inner & (parents >= 0)
+        np.minimum.at(first_use, parents[has_parent], rank[has_parent])
+    leaves = reachable & (op == compact_engine.LEAF) & (first_use < np.iinfo(np.int64).max)
+    rank[leaves] = first_use[leaves] - 1
+    return rank
+
+
+def _order(x: np.ndarray, edges: np.ndarray, sweeps: int = ORDERING_SWEEPS) -> np.ndarray:
+    """Position of every node inside its column. Barycenter heuristic: each sweep sorts every column by the mean
+    position of the nodes connected to it, going right then left, all columns at once."""
+    n = len(x)
+    # Start from the creation order, centered in every column
+    position = np.empty(n)
+    order = np.lexsort((np.arange(n), x))
+    _assign(position, order, x)
+    if len(edges) == 0:
+        return position
+
+    src, dst = edges[:, 0], edges[:, 1]
+    for sweep in range(sweeps):
+        # Forward sweeps look at the parents of a node, backward sweeps at its children
+        frm, to = (src, dst) if sweep % 2 == 0 else (dst, src)
+        total = np.bincount(to, weights=position[frm], minlength=n)
+        count = np.bincount(to, minlength=n)
+        barycenter = np.where(count > 0, total / np.maximum(count, 1), position)
+        order = np.lexsort((position, barycenter, x))
+        _assign(position, order, x)
+    return position
+
+def _assign(position: np.ndarray, order: np.ndarray, x: np.ndarray):
+    """Writes 0, 1, 2... along order inside every column, minus half the height of the column."""
+    sorted_x = x[order]
+    starts = np.flatnonzero(np.r_[True, sorted_x[1:] != sorted_x[:-1]])
+    sizes = np.diff(np.r_[starts, len(order)])
+    index_in_column = np.arange(len(order)) - np.repeat(starts, sizes)
+    position[order] = index_in_column - (np.repeat(sizes, sizes) - 1) / 2
+
+
+def _group(rank: np.ndarray, op: np.ndarray, nodes: np.ndarray, max_nodes: int) -> tuple:
+    """Groups the nodes by (column, op), merging neighbouring columns until at most max_nodes groups are left."""
+    n_ranks = int(rank[nodes].max()) + 1
+    n_bins = n_ranks
+    while True:
+        column = rank[nodes] * n_bins // n_ranks
+        keys, group = np.unique(column * 256 + op[nodes], return_inverse=True)
+        if len(keys) <= max_nodes or n_bins == 1:
+            return keys // 256, keys % 256, group
+        n_bins = max(1, n_bins // 2)
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_layout(structure: bytes, max_nodes: int) -> GraphLayout:
+    n = len(structure) // 9
+    lhs = np.frombuffer(structure, dtype=np.int32, count=n)
+    rhs = np.frombuffer(structure, dtype=np.int32, count=n, offset=4 * n)
+    op = np.frombuffer(structure, dtype=np.uint8, count=n, offset=8 * n)
+
+    # Nodes the root depends on, in a single backward pass over the indices
+    reachable = np.zeros(n, dtype=bool)
+    reachable[n - 1] = True
+    for i in range(n - 1, -1, -1):
+        if reachable[i]:
+            if lhs[i] >= 0:
+                reachable[lhs[i]] = True
+            if rhs[i] >= 0:
+                reachable[rhs[i]] = True
+    nodes = np.flatnonzero(reachable)
+    rank = _ranks(op, lhs, rhs, reachable)
+
+    collapsed = len(nodes) > max_nodes
+    if collapsed:
+        x, group_op, group_of_node = _group(rank, op, nodes, max_nodes)
+    else:
+        x, group_op, group_of_node = rank[nodes], op[nodes], np.arange(len(nodes))
+    group = np.full(n, -1, dtype=np.int64)
+    group[nodes] = group_of_node
+    counts = np.bincount(group_of_node, minlength=len(x))
+
+    inner = nodes[op[nodes] != compact_engine.LEAF]
+    edges = np.concatenate([
+        np.stack([group[parents[inner]], group[inner]], axis=1)
+        for parents in (lhs, rhs)
+    ])
+    edges = edges[edges[:, 0] >= 0]
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    edges, edge_counts = np.unique(edges, axis=0, return_counts=True) if len(edges) else (edges, np.zeros(0, int))
+
+    x = x - x.min()
+    y = _order(x, edges)
+    ops = [compact_engine.OP_NAMES[code] for code in group_op.tolist()]
+    key = hashlib.blake2b(structure, digest_size=8).hexdigest()
+    return GraphLayout(key, group, ops, counts, x, y, edges, edge_counts, collapsed)
+
+
+def graph_layout(root: compact_engine.Value, max_nodes: int = 300) -> GraphLayout:
+    """Layout of the graph that computes root. Layouts are cached by graph structure (op codes and parent indices),
+    so a graph rebuilt on every rerun, or whose values and gradients changed, reuses the layout computed the first
+    time.
+
+    :param root: Output of the graph.
+    :type root: compact_engine.Value
+    :param max_nodes: Largest number of nodes drawn one by one; bigger graphs are collapsed. Defaults to 300
+    :type max_nodes: int, optional
+    :return: The layout.
+    :rtype: GraphLayout
+    """
+    graph, n = root.graph, root.idx + 1
+    structure = b''.join(memoryview(buffer)[:n].tobytes() for buffer in (graph.lhs, graph.rhs, graph.op))
+    return _cached_layout(structure, max_nodes)
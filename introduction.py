@@ -2,10 +2,17 @@ import streamlit
 from streamlit_echarts import st_echarts
 import numpy as np
 import matplotlib.pyplot as plt
-from micrograd.engine import Value
+from tensor_engine import Tensor, Tape
 import long_texts, table_of_contents
 import plotting_functions
 import math_in_latex
+import forward_mode
+import functools
+import optimization_sweeps
+import second_order
+import live_training
+import decision_grid
+import example_graphs
 
 def create_intro_page(sidebar):
     """Creates the introduction page. Takes a streamlit sidebar as input.
@@ -153,9 +160,10 @@ def create_derivatives_page(sidebar = None):
     
     parabola_plot_col, _, right_of_plot_col = streamlit.columns([2, 1, 3])
 
+    x_options = [-1, 0, 0.5, 1]
     x = parabola_plot_col.radio(
         'Select the point (x) in which you want to evaluate the derivative of f(x):',
-        [-1, 0, 0.5, 1],
+        x_options,
         index=3
     )
     h = parabola_plot_col.select_slider(
@@ -168,10 +176,15 @@ def create_derivatives_page(sidebar = None):
     outputs = plotting_functions.test_parabola(inputs)
     x1, x2, y1, y2 = (inputs[0], inputs[1], outputs[0], outputs[1])
 
-    dict_params = {'h': h, 'x': x, 'slope': (y2 - y1)/(x2 - x1)}
+    _, actual_slope = forward_mode.derivative(plotting_functions.test_parabola, x)
+
+    dict_params = {'h': h, 'x': x, 'slope': (y2 - y1)/(x2 - x1), 'actual_slope': float(actual_slope)}
     right_of_plot_text = long_texts.right_of_plot_text(config='style="font-size: 18px;"', html_tag_type = "ul", dict_params=dict_params)
     streamlit.markdown(right_of_plot_text, unsafe_allow_html=True)
 
+    plotting_functions.plot_derivative_vs_finite_difference(h=h)
+    plotting_functions.plot_finite_difference_convergence(x=x, x_options=x_options, h=h)
+
     toc.generate()
 
 
@@ -300,4 +313,175 @@ def create_max_min_concept_derivatives(sidebar):
 
     streamlit.write('\n')
 
-    toc.header("Defining the Chain Rule", font_size=24)
\ No newline at end of file
+    toc.header("Defining the Chain Rule", font_size=24)
+
+    toc.header("Gradient descent", font_size=24)
+
+    sweep_col, _ = streamlit.columns([4, 1])
+
+    sweep_text = long_texts.gradient_descent_sweep_text(config='style="font-size: 18px;"', html_tag_type = "p")
+    sweep_col.markdown(sweep_text, unsafe_allow_html=True)
+
+    slider_col, plot_col = streamlit.columns([3, 6])
+    a = slider_col.slider('"a" parameter of the parabola (must be positive to have a minimum):', 0.25, 4., value=1., step=0.25)
+    b = slider_col.slider('"b" parameter of the parabola:', -4., 4., value=0., step=0.25)
+    n_steps = slider_col.slider('Number of gradient descent steps:', 1, 200, value=30)
+    n_runs = slider_col.select_slider('Number of runs (starting points x learning rates):', [100, 1000, 10_000, 100_000], value=1000)
+
+    n_lrs = int(np.sqrt(n_runs))
+    starts = np.linspace(-4, 4, n_runs // n_lrs)
+    learning_rates = np.linspace(0.01, 1.2 / a, n_lrs)
+    trajectories = optimization_sweeps.sweep(
+        functools.partial(optimization_sweeps.parabola, a=a, b=b), starts, learning_rates, n_steps=n_steps
+    )
+    with plot_col:
+        plotting_functions.plot_learning_rate_sweep(learning_rates, trajectories, vertex=-b / (2 * a))
+
+    toc.header("Newton's method", font_size=24)
+
+    newton_col, _ = streamlit.columns([4, 1])
+
+    newton_text = long_texts.newton_method_text(config='style="font-size: 18px;"', html_tag_type = "p")
+    newton_col.markdown(newton_text, unsafe_allow_html=True)
+
+    x0 = newton_col.slider('Starting point for Newton\'s method:', -4., 4., value=3., step=0.25)
+    x_newton = Tensor(x0)
+    newton = second_order.Newton(Tape(a * x_newton**2 + b * x_newton), [x_newton])
+    iterates = [x0]
+    for _ in range(3):
+        newton.step()
+        iterates.append(float(x_newton.data))
+    newton_col.markdown(
+        '<ul style="font-size: 18px;">' +
+        ''.join(f'<li>Step {i}: x = <b>{x_val:.6f}</b></li>' for i, x_val in enumerate(iterates)) +
+        f'<li>Vertex of the parabola: x = -b / 2a = <b>{-b / (2 * a):.6f}</b></li></ul>',
+        unsafe_allow_html=True
+    )
+
+    toc.generate()
+
+
+def create_building_micrograd_page(sidebar):
+    """Creates the Building micrograd page. Takes a streamlit sidebar as input.
+
+    The example graphs are not rebuilt on every rerun: they are loaded from files prebuilt by example_graphs, which
+    every session maps copy-on-write, so the backward pass of one session never touches the graph of another.
+
+    :param sidebar: Streamlit sidebar object to be passed if you need a sidebar with content.
+    :type sidebar: sidebar or None
+    """
+    if sidebar is None:
+        sidebar = streamlit.sidebar()
+
+    sidebar.markdown('<h1>Table of Contents:</h1>', unsafe_allow_html=True)
+
+    toc = table_of_contents.TableOfContents()
+    toc.placeholder(sidebar=True)
+
+    streamlit.markdown('<h1 style="font-size: 38px;">Building micrograd<br></h1>', unsafe_allow_html=True)
+    streamlit.markdown('<h2 style="font-size: 30px;">Values and computation graphs<br><br></h2>', unsafe_allow_html=True)
+
+    toc.header("The computation graph", font_size=24)
+
+    text_col, _ = streamlit.columns([4, 1])
+    text = long_texts.building_micrograd_text(config='style="font-size: 18px;"', html_tag_type = "p")
+    text_col.markdown(text, unsafe_allow_html=True)
+
+    select_col, graph_col = streamlit.columns([3, 6])
+    titles = {'expression': 'L = (a*b + c) * f', 'neuron': 'A tanh neuron', 'mlp_loss': 'Loss of an MLP'}
+    example = select_col.selectbox('Example:', list(titles), format_func=titles.get)
+    max_nodes = select_col.select_slider('Largest graph drawn node by node:', [50, 100, 300], value=100)
+
+    graph, names = example_graphs.load_example_graph(example)
+    root = names[example_graphs.OUTPUTS[example]]
+    root.backward()
+
+    with graph_col:
+        streamlit.markdown(
+            f'<p style="font-size: 18px;">{len(graph)} nodes, output {example_graphs.OUTPUTS[example]} = '
+            f'<b>{root.data:.4f}</b></p>',
+            unsafe_allow_html=True
+        )
+        plotting_functions.plot_computation_graph(root, labels=names, max_nodes=max_nodes)
+    with select_col:
+        streamlit.markdown(
+            '<ul style="font-size: 18px;">' +
+            ''.join(f'<li>{name}: data = <b>{v.data:.4f}</b>, grad = <b>{v.grad:.4f}</b></li>' for name, v in names.items()) +
+            '</ul>',
+            unsafe_allow_html=True
+        )
+
+    toc.generate()
+
+
+def create_backpropagation_page(sidebar):
+    """Creates the Backpropagation page. Takes a streamlit sidebar as input.
+
+    Training progress is streamed into st.empty placeholders, which replace their content in place while the script
+    keeps running, so there is no rerun per step. The trainer lives in session_state, so a rerun in the middle of
+    training (any widget change interrupts the script) resumes from the last step instead of starting over.
+
+    :param sidebar: Streamlit sidebar object to be passed if you need a sidebar with content.
+    :type sidebar: sidebar or None
+    """
+    if sidebar is None:
+        sidebar = streamlit.sidebar()
+
+    sidebar.markdown('<h1>Table of Contents:</h1>', unsafe_allow_html=True)
+
+    toc = table_of_contents.TableOfContents()
+    toc.placeholder(sidebar=True)
+
+    streamlit.markdown('<h1 style="font-size: 38px;">Backpropagation<br></h1>', unsafe_allow_html=True)
+    streamlit.markdown('<h2 style="font-size: 30px;">Training a neural network, live<br><br></h2>', unsafe_allow_html=True)
+
+    toc.header("Training an MLP on the moons dataset", font_size=24)
+
+    training_col, _ = streamlit.columns([4, 1])
+
+    training_text = long_texts.live_training_text(config='style="font-size: 18px;"', html_tag_type = "p")
+    training_col.markdown(training_text, unsafe_allow_html=True)
+
+    slider_col, plot_col = streamlit.columns([3, 6])
+    hidden = slider_col.select_slider('Neurons in each hidden layer:', [4, 8, 16, 32], value=16)
+    batch_size = slider_col.select_slider('Minibatch size:', [8, 16, 32, 64, 128], value=32)
+    learning_rate = slider_col.slider('Learning rate:', 0.01, 1., value=0.1, step=0.01)
+    n_steps = slider_col.select_slider('Training steps per run:', [100, 500, 1000, 2000, 5000], value=1000)
+    reset = slider_col.button('Reset')
+    train = slider_col.button('Train')
+
+    trainer = streamlit.session_state.get('moons_trainer')
+    if reset or trainer is None or streamlit.session_state.get('moons_trainer_shape') != (hidden, batch_size):
+        trainer = live_training.MoonsTrainer(hidden=hidden, batch_size=batch_size, learning_rate=learning_rate)
+        streamlit.session_state['moons_trainer'] = trainer
+        streamlit.session_state['moons_trainer_shape'] = (hidden, batch_size)
+    trainer.learning_rate = learning_rate
+
+    with plot_col:
+        status = streamlit.empty()
+        curve = streamlit.empty()
+        boundary = streamlit.empty()
+
+    # Every update redraws both charts in full from the trainer: the echarts component can't append points, and a
+    # component key can't be reused within a run, so each update mounts new charts. train() throttles the updates to
+    # a few per second, and plot_training_curve subsamples the history, so a redraw costs the same at any step.
+    def show_progress():
+        step, loss, accuracy = trainer.history[-1] if trainer.history else (0, float('nan'), float('nan'))
+        status.markdown(
+            f'<p style="font-size: 18px;">Step <b>{step}</b>: loss = <b>{loss:.4f}</b>, minibatch accuracy = '
+            f'<b>{accuracy:.0%}</b></p>',
+            unsafe_allow_html=True
+        )
+        with curve:
+            plotting_functions.plot_training_curve(trainer.history, key=f'moons-curve-{trainer.steps}')
+        with boundary:
+            plotting_functions.plot_decision_boundary(
+                trainer.predict, trainer.X, trainer.y, version=decision_grid.parameter_version(trainer.parameters),
+                key=f'moons-boundary-{trainer.steps}'
+            )
+
+    show_progress()
+    if train:
+        trainer.train(n_steps, callback=show_progress)
+
+    toc.generate()
@@ -0,0 +1,99 @@
+import time
+import numpy as np
+from tensor_engine import Tensor, Tape
+from tensor_nn import MLP
+from toy_datasets import make_moons
+
+
+class MoonsTrainer:
+    """Minibatch training of an MLP on the moons dataset, with the max-margin loss of the micrograd demo. The graph of
+    one training step is recorded once on a Tape; every step only copies a new minibatch into the input leaves and
+    replays it, so thousands of steps don't rebuild thousands of graphs.
+
+    The trainer keeps its state (parameters, loss history, step counter) between calls, so a streamlit page can keep
+    it in session_state and resume training after a rerun instead of starting over.
+    """
+
+    def __init__(self, hidden: int = 16, batch_size: int = 32, learning_rate: float = 0.1, alpha: float = 1e-4,
+                 n_samples: int = 200, noise: float = 0.1, seed: int = 0):
+        """
+        :param hidden: Neurons in each of the two hidden layers. Defaults to 16
+        :type hidden: int, optional
+        :param batch_size: Points per minibatch. Defaults to 32
+        :type batch_size: int, optional
+        :param learning_rate: Step of stochastic gradient descent. Defaults to 0.1
+        :type learning_rate: float, optional
+        :param alpha: Strength of the L2 regularization. Defaults to 1e-4
+        :type alpha: float, optional
+        :param n_samples: Points in the dataset. Defaults to 200
+        :type n_samples: int, optional
+        :param noise: Noise of the dataset. Defaults to 0.1
+        :type noise: float, optional
+        :param seed: Seed of the dataset, the initialization and the minibatches. Defaults to 0
+        :type seed: int, optional
+        """
+        self.rng = np.random.default_rng(seed)
+        self.X, self.y = make_moons(n_samples, noise=noise, rng=self.rng)
+        self.model = MLP(2, [hidden, hidden, 1], nonlin='relu', rng=self.rng)
+        self.parameters = self.model.parameters()
+        self.batch_size = min(batch_size, n_samples)
+        self.learning_rate = learning_rate
+        self.steps = 0
+        self.history = [] # (step, loss, accuracy) of every training step
+
+        self.xb = Tensor(np.zeros((self.batch_size, 2)))
+        self.yb = Tensor(np.zeros((self.batch_size, 1)))
+        scores = self.model(self.xb)
+        data_loss = (1 + -self.yb * scores).relu().mean()
+        reg_loss = alpha * sum((p * p).sum() for p in self.parameters)
+        self.scores = scores
+        self.tape = Tape(data_loss + reg_loss)
+
+    def step(self) -> tuple:
+        """Runs one training step on a random minibatch.
+
+        :return: Tuple (loss, accuracy) on the minibatch, before the update.
+        :rtype: tuple
+        """
+        batch = self.rng.choice(len(self.X), self.batch_size, replace=False)
+        self.xb.data = self.X[batch]
+        self.yb.data = self.y[batch].reshape(-1, 1)
+        loss = float(self.tape.forward().data)
+        self.tape.backward()
+        for p in self.parameters:
+            p.data = p.data - self.learning_rate * p.grad
+
+        accuracy = float(np.mean((self.scores.data[:, 0] > 0) == (self.yb.data[:, 0] > 0)))
+        self.steps += 1
+        self.history.append((self.steps, loss, accuracy))
+        return loss, accuracy
+
+    def train(self, n_steps: int, callback=None, every: float = 0.25):
+        """Runs n_steps training steps, calling callback() at most once every `every` seconds (and once at the end).
+        Throttling by time bounds the number of page updates however fast the steps are.
+
+        :param n_steps: Number of steps.
+        :type n_steps: int
+        :param callback: Called without arguments; it reads the progress from the trainer (history, steps). Defaults
+        to None
+        :type callback: callable, optional
+        :param every: Minimum number of seconds between two callbacks. Defaults to 0.25
+        :type every: float, optional
+        """
+        last = time.perf_counter()
+        for i in range(n_steps):
+            self.step()
+            now = time.perf_counter()
+            if callback is not None and (now - last >= every or i == n_steps - 1):
+                callback()
+                last = now
+
+    def predict(self, points: np.ndarray) -> np.ndarray:
+        """Scores of the model, positive for class 1 and negative for class -1.
+
+        :param points: Points with shape (n, 2).
+        :type points: np.ndarray
+        :return: Scores with shape (n,).
+        :rtype: np.ndarray
+        """
+        return self.model(Tensor(points)).data[:, 0]
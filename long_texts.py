@@ -243,7 +243,7 @@ def right_of_plot_text(config: str, html_tag_type: str = "ul", dict_params: dict
     h = dict_params.get("h")
     x = dict_params.get('x')
     slope = dict_params.get('slope')
-    actual_slope = 2*x
+    actual_slope = dict_params.get('actual_slope', 2*x)
     if actual_slope == 0:
         ratio = slope * 100
     else:
@@ -587,4 +587,91 @@ def answer_question3_intro(config: str, html_tag_type: str = "p", is_correct: bo
 
     markdown = wrap_text_markdown(text, config, html_tag_type)
 
-    return markdown
\ No newline at end of file
+    return markdown
+
+def gradient_descent_sweep_text(config: str, html_tag_type: str = "p") -> str:
+    """Generates the text that introduces the gradient descent sweep on the Min/Max page.
+
+    :param config: The attributes of the html tag. If it is a string, it will be something 
+    like: style="font-family:Courier; color:Blue; font-size: 20px;"
+    :type config: str
+    :param html_tag_type: HTML name of the tag, for example table, p, h1, etc. Defaults to "p"
+    :type html_tag_type: str, optional
+    """
+    text = """The derivative tells us in which direction the function grows. If we want to find the <b>minimum</b> of a function, 
+    we can start at any point and take small steps in the <b>opposite</b> direction of the derivative: x = x - lr * f'(x). 
+    This is called <b>gradient descent</b>, and "lr" (the <b>learning rate</b>) controls how big each step is.<br><br>
+    Below we run gradient descent on the parabola from many starting points and with many learning rates at the same time. 
+    With a learning rate that is too small we barely move, with a good one we land on the vertex of the parabola in a few steps, 
+    and with one that is too big we jump over the vertex again and again and end up <b>diverging</b>.
+    """
+
+    markdown = wrap_text_markdown(text, config, html_tag_type)
+
+    return markdown
+
+def newton_method_text(config: str, html_tag_type: str = "p") -> str:
+    """Generates the text that introduces Newton's method on the Min/Max page.
+
+    :param config: The attributes of the html tag. If it is a string, it will be something 
+    like: style="font-family:Courier; color:Blue; font-size: 20px;"
+    :type config: str
+    :param html_tag_type: HTML name of the tag, for example table, p, h1, etc. Defaults to "p"
+    :type html_tag_type: str, optional
+    """
+    text = """Gradient descent only uses the <b>first</b> derivative, so it has to guess how big each step should be. 
+    If we also know the <b>second</b> derivative (how fast the slope itself changes) we can compute the step directly: 
+    x = x - f'(x) / f''(x). This is <b>Newton's method</b>. On a parabola the second derivative is constant (2a), so a single 
+    Newton step lands exactly on the vertex, no matter where we start or how the parabola is scaled. For functions with many 
+    parameters, like the loss of a neural network, the second derivative becomes a matrix (the <b>Hessian</b>), and 
+    <b>damped Newton</b> methods keep the steps safe while still converging in a handful of iterations.
+    """
+
+    markdown = wrap_text_markdown(text, config, html_tag_type)
+
+    return markdown
+
+def live_training_text(config: str, html_tag_type: str = "p") -> str:
+    """Generates the text that introduces the live training demo on the Backpropagation page.
+
+    :param config: The attributes of the html tag. If it is a string, it will be something 
+    like: style="font-family:Courier; color:Blue; font-size: 20px;"
+    :type config: str
+    :param html_tag_type: HTML name of the tag, for example table, p, h1, etc. Defaults to "p"
+    :type html_tag_type: str, optional
+    """
+    text = """Everything we have seen so far comes together here. Below, a small neural network (an <b>MLP</b> with two hidden 
+    layers) learns to separate the two classes of the <b>moons</b> dataset. Every training step takes a random 
+    <b>minibatch</b> of points, computes the loss in a forward pass, gets the gradient of the loss with respect to every 
+    weight with <b>backpropagation</b> (the chain rule, applied node by node from the loss back to the weights), and then 
+    takes a gradient descent step.<br><br>
+    Press <b>Train</b> and watch the loss go down and the decision boundary bend around the data while the network trains. 
+    Pressing it again continues from where it stopped; change the size of the network or press <b>Reset</b> to start over.
+    """
+
+    markdown = wrap_text_markdown(text, config, html_tag_type)
+
+    return markdown
+
+
+def building_micrograd_text(config: str, html_tag_type: str = "p") -> str:
+    """Generates the text that introduces the computation graphs on the Building micrograd page.
+
+    :param config: The attributes of the html tag. If it is a string, it will be something 
+    like: style="font-family:Courier; color:Blue; font-size: 20px;"
+    :type config: str
+    :param html_tag_type: HTML name of the tag, for example table, p, h1, etc. Defaults to "p"
+    :type html_tag_type: str, optional
+    """
+    text = """micrograd keeps every number of a computation in a <b>Value</b> that remembers which operation produced it 
+    and from which other Values. Together they form a <b>computation graph</b>: the inputs and weights are its leaves, 
+    and the output (a loss, for a neural network) is its root. Calling <b>backward()</b> on the root walks the graph 
+    from the root back to the leaves and applies the chain rule at every node, so that each Value ends up with the 
+    gradient of the output with respect to itself.<br><br>
+    Pick one of the examples of the lecture below: the expression L = (a*b + c) * f, a single tanh neuron, or the loss of 
+    a small MLP on four examples, and look at the value and the gradient of every named node.
+    """
+
+    markdown = wrap_text_markdown(text, config, html_tag_type)
+
+    return markdown
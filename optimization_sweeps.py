@@ -0,0 +1,108 @@
+import os
+import atexit
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import forward_mode
+
+# Sweeps smaller than this run in the calling process: below it, shipping the work to another process costs more
+# than the vectorized gradient descent itself
+MIN_RUNS_PER_WORKER = 20_000
+
+# One pool per number of workers, never shut down while the process runs: another session's sweep may still be
+# submitting to it. There are at most os.cpu_count() of them
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def parabola(x, a: float = 1., b: float = 0., c: float = 0.):
+    """The parabola a*x^2 + b*x + c. Module level (and used through functools.partial) so that it can be sent to
+    worker processes.
+    """
+    return a * x**2 + b * x + c
+
+
+def gradient_descent(function, x0: np.ndarray, learning_rates: np.ndarray, n_steps: int) -> np.ndarray:
+    """Runs one gradient descent per (x0[i], learning_rates[i]) pair, all of them at once: every step differentiates
+    the function on the whole vector of current points with forward_mode.
+
+    :param function: Function of one variable built from arithmetic operators and NumPy ufuncs.
+    :type function: callable
+    :param x0: Starting points, shape (n_runs,).
+    :type x0: np.ndarray
+    :param learning_rates: Learning rate of each run, shape (n_runs,).
+    :type learning_rates: np.ndarray
+    :param n_steps: Number of gradient descent steps.
+    :type n_steps: int
+    :return: Trajectories with shape (n_runs, n_steps + 1); column 0 holds the starting points.
+    :rtype: np.ndarray
+    """
+    trajectories = np.empty((len(x0), n_steps + 1))
+    x = np.asarray(x0, dtype=np.float64)
+    trajectories[:, 0] = x
+    # Diverging runs overflow to inf/nan; that is a result to plot, not an error
+    with np.errstate(over='ignore', invalid='ignore'):
+        for step in range(1, n_steps + 1):
+            _, slope = forward_mode.derivative(function, x)
+            x = x - learning_rates * slope
+            trajectories[:, step] = x
+    return trajectories
+
+
+def _get_executor(workers: int) -> ProcessPoolExecutor:
+    """Process pool with this many workers, shared across calls, so that a streamlit rerun doesn't pay for starting
+    the workers again.
+
+    Workers are started with forkserver (spawn where it isn't available) rather than fork: the pool is created from
+    a script thread of the multi-threaded streamlit server, and a forked child can deadlock on a lock that another
+    thread held at the time of the fork."""
+    with _executors_lock:
+        if workers not in _executors:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            context = multiprocessing.get_context(method)
+            _executors[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return _executors[workers]
+
+@atexit.register
+def _shutdown_executors():
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        _executors.clear()
+
+
+def sweep(function, starts, learning_rates, n_steps: int = 50, workers: int = None) -> np.ndarray:
+    """Gradient descent for every combination of starting point and learning rate. Each worker process runs a
+    contiguous chunk of the combinations as one vectorized gradient_descent call.
+
+    :param function: Picklable function of one variable, e.g. functools.partial(parabola, a=2., b=1.).
+    :type function: callable
+    :param starts: Starting points, shape (n_starts,).
+    :type starts: np.array
+    :param learning_rates: Learning rates, shape (n_lrs,).
+    :type learning_rates: np.array
+    :param n_steps: Number of gradient descent steps. Defaults to 50
+    :type n_steps: int, optional
+    :param workers: Number of worker processes. Defaults to None (one per CPU, and none at all for small sweeps)
+    :type workers: int, optional
+    :return: Trajectories with shape (n_starts, n_lrs, n_steps + 1).
+    :rtype: np.ndarray
+    """
+    starts = np.asarray(starts, dtype=np.float64)
+    learning_rates = np.asarray(learning_rates, dtype=np.float64)
+    x0, lr = (grid.ravel() for grid in np.meshgrid(starts, learning_rates, indexing='ij'))
+
+    workers = workers if workers is not None else os.cpu_count() or 1
+    workers = max(1, min(workers, len(x0) // MIN_RUNS_PER_WORKER))
+    if workers == 1:
+        trajectories = gradient_descent(function, x0, lr, n_steps)
+    else:
+        bounds = np.linspace(0, len(x0), workers + 1).astype(int)
+        run_chunk = functools.partial(gradient_descent, function, n_steps=n_steps)
+        executor = _get_executor(workers)
+        futures = [executor.submit(run_chunk, x0[lo:hi], lr[lo:hi]) for lo, hi in zip(bounds, bounds[1:])]
+        trajectories = np.concatenate([future.result() for future in futures])
+
+    return trajectories.reshape(len(starts), len(learning_rates), n_steps + 1)
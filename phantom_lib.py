@@ -1,13 +1,12 @@
 import matplotlib.pyplot as plt
 import numpy as np
-import random
 from PIL import Image
 # import PIL.ImageOps    
 
 # import torchvision
 # import torchvision.datasets as datasets
 # import torchvision.transforms as transforms
-from torch.utils.data import DataLoader, Dataset
+from torch.utils.data import DataLoader, Dataset, IterableDataset, Sampler, get_worker_info
 # import torchvision.utils
 import torch
 import torch.nn as nn
@@ -29,54 +28,245 @@ def show_plot(iteration,loss):
     plt.plot(iteration,loss)
     plt.show()
 
+###### PREPROCESSED IMAGE STORE ######
+
+def preprocess_image_folder(imageFolderDataset, path, size=(100, 100)):
+    """Decodes and resizes every image of imageFolderDataset once, into a single uint8 array of shape
+    (n_images, 3, height, width) saved at path + '.images.npy', with the labels at path + '.labels.npy'.
+    Open the result with ImageStore(path)."""
+    imgs = imageFolderDataset.imgs
+    images = np.lib.format.open_memmap(
+        path + '.images.npy', mode='w+', dtype=np.uint8, shape=(len(imgs), 3, size[1], size[0])
+    )
+    for k, (image_path, _) in enumerate(imgs):
+        with Image.open(image_path) as img:
+            images[k] = np.asarray(img.convert("RGB").resize(size)).transpose(2, 0, 1)
+    images.flush()
+    del images
+    np.save(path + '.labels.npy', np.array([label for _, label in imgs], dtype=np.int64))
+
+class ImageStore:
+    """Images written by preprocess_image_folder, memory-mapped read-only. Reading an image is a view into the
+    mapped file, without any decoding. The mapping is opened lazily and never pickled, so every DataLoader worker maps
+    the same file and they all share its pages through the OS page cache instead of holding copies."""
+
+    def __init__(self, path):
+        self.path = path
+        self.labels = np.load(path + '.labels.npy')
+        self._images = None
+
+    @property
+    def images(self):
+        if self._images is None:
+            self._images = np.load(self.path + '.images.npy', mmap_mode='r')
+        return self._images
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_images'] = None
+        return state
+
+    def __getitem__(self, index):
+        return self.images[index]
+
+    def __len__(self):
+        return len(self.labels)
+
 ###### SET UP THE DATASET GENERATOR ######
 
 class SiameseNetworkDataset(Dataset):
-    def __init__(self, imageFolderDataset, transform=None):
+    def __init__(self, imageFolderDataset=None, transform=None, image_store=None, seed=None):
+        # With an image_store, images come preprocessed from it as (3, height, width) float tensors in [0, 1], and
+        # transform (if any) must work on such tensors
+        if (imageFolderDataset is None) == (image_store is None):
+            raise ValueError("pass either imageFolderDataset or image_store")
         self.imageFolderDataset = imageFolderDataset    
         self.transform = transform
-        
-    def __getitem__(self, index):
-        img0_tuple = random.choice(self.imageFolderDataset.imgs)
-
-        #We need to approximately 50% of images to be in the same class
-        should_get_same_class = random.randint(0,1) 
-        if should_get_same_class:
-            while True:
-                #Look until the same class image is found
-                img1_tuple = random.choice(self.imageFolderDataset.imgs) 
-                if img0_tuple[1] == img1_tuple[1]:
-                    break
+        self.image_store = image_store
+        # Without a seed, one is drawn from the OS and kept in self.seed, so any run can be replayed
+        self.seed = seed if seed is not None else np.random.SeedSequence().entropy
+
+        # Class -> images index, built once: the images of class k are
+        # self.by_class[self.class_start[k]:self.class_start[k + 1]]
+        if image_store is not None:
+            self.labels = image_store.labels
         else:
+            self.labels = np.array([label for _, label in imageFolderDataset.imgs], dtype=np.int64)
+        self.classes, counts = np.unique(self.labels, return_counts=True)
+        self.by_class = np.argsort(self.labels, kind='stable')
+        self.class_start = np.concatenate([[0], np.cumsum(counts)])
+        self.class_of = np.searchsorted(self.classes, self.labels)
+
+        # [epoch given to set_epoch, items drawn since]. In shared memory, so that DataLoader workers (persistent or
+        # not) see the epoch the main process sets, and count the items they draw together
+        self._epoch_state = torch.zeros(2, dtype=torch.int64).share_memory_()
+        self._plan_epoch = None
+
+    def sample_positive(self, anchors, rng):
+        """Random image of the same class as each anchor (possibly the anchor itself), in constant time per anchor."""
+        k = self.class_of[anchors]
+        lo, count = self.class_start[k], self.class_start[k + 1] - self.class_start[k]
+        return self.by_class[lo + (rng.random(np.shape(anchors)) * count).astype(np.int64)]
+
+    def sample_negative(self, anchors, rng):
+        """Random image of a different class than each anchor, in constant time per anchor: draws a position among
+        the images of the other classes and skips over the block of the anchor's class."""
+        k = self.class_of[anchors]
+        lo, count = self.class_start[k], self.class_start[k + 1] - self.class_start[k]
+        n_other = len(self.labels) - count
+        if np.any(n_other == 0):
+            raise ValueError("can't draw a pair of different classes from a dataset with a single class")
+        position = (rng.random(np.shape(anchors)) * n_other).astype(np.int64)
+        position += np.where(position >= lo, count, 0)
+        return self.by_class[position]
+
+    def pair_plan(self, epoch, n_pairs=None):
+        """Pairs of an epoch as an (n_pairs, 3) int array of rows (i, j, label), label being 0 for the same class and
+        1 for different classes. About half of the pairs are from the same class. The plan only depends on
+        (self.seed, epoch), so every process that builds it gets the same one.
 
-            while True:
-                #Look until a different class image is found
-                img1_tuple = random.choice(self.imageFolderDataset.imgs) 
-                if img0_tuple[1] != img1_tuple[1]:
-                    break
+        :param epoch: Epoch number.
+        :type epoch: int
+        :param n_pairs: Number of pairs. Defaults to None (one per image)
+        :type n_pairs: int, optional
+        :return: The plan.
+        :rtype: np.ndarray
+        """
+        rng = np.random.default_rng([self.seed, epoch])
+        n_pairs = len(self.labels) if n_pairs is None else n_pairs
+        anchors = rng.integers(len(self.labels), size=n_pairs)
+        same = rng.random(n_pairs) < 0.5
+        partners = np.where(same, self.sample_positive(anchors, rng), self.sample_negative(anchors, rng))
+        dtype = np.int32 if len(self.labels) < 2**31 else np.int64
+        return np.stack([anchors, partners, self.labels[anchors] != self.labels[partners]], axis=1).astype(dtype)
 
-        img0 = Image.open(img0_tuple[0])
-        img1 = Image.open(img1_tuple[0])
+    def set_epoch(self, epoch):
+        """Switches __getitem__ to the pair plan of another epoch, in this process and in the DataLoader workers.
+        Calling it at the start of every epoch makes a run reproducible. Without it, the epoch moves forward by
+        itself every len(self) items drawn, so a training loop that never calls it still gets new pairs every epoch
+        (but which epoch an item falls into then depends on the order the workers draw items in)."""
+        self._epoch_state[0] = epoch
+        self._epoch_state[1] = 0
 
-        # img0 = img0.convert("P")  # .convert("L") for one-channel (black and white) image
-        # img1 = img1.convert("P")  # .convert("L") for one-channel (black and white) image
+    @property
+    def epoch(self):
+        return int(self._epoch_state[0]) + int(self._epoch_state[1]) // max(len(self), 1)
+
+    def _plan_of_current_epoch(self):
+        # The increment isn't atomic across workers; a lost count only shifts the epoch boundary by an item
+        epoch = self.epoch
+        self._epoch_state[1] += 1
+        if epoch != self._plan_epoch:
+            # Rebuilt in every process that needs it: the plan only depends on (seed, epoch)
+            self.plan = self.pair_plan(epoch)
+            self._plan_epoch = epoch
+        return self.plan
+
+    def load_image(self, i):
+        if self.image_store is not None:
+            # Read straight from the mapped file; the only copy is the conversion to float
+            img = torch.from_numpy(self.image_store[i] / np.float32(255))
+        else:
+            img = Image.open(self.imageFolderDataset.imgs[i][0])
+            # img = img.convert("P")  # .convert("L") for one-channel (black and white) image
 
         if self.transform is not None:
-            img0 = self.transform(img0)
-            img1 = self.transform(img1)
+            img = self.transform(img)
+        return img
+
+    def load_pair(self, i, j):
+        """Loads images i and j and the label of the pair: 0 for the same class, 1 for different classes."""
+        img0 = self.load_image(i)
+        img1 = self.load_image(j)
         
-        return img0, img1, torch.from_numpy(np.array([int(img1_tuple[1] != img0_tuple[1])], dtype=np.float32))
+        return img0, img1, torch.from_numpy(np.array([int(self.labels[i] != self.labels[j])], dtype=np.float32))
+
+    def __getitem__(self, index):
+        # Pairs chosen by a batch sampler (see BalancedBatchSampler) come in as (i, j) tuples
+        if isinstance(index, tuple):
+            return self.load_pair(*index)
+
+        # Item index of the epoch's plan: the same pair whichever worker loads it
+        i, j, _ = self._plan_of_current_epoch()[index].tolist()
+        return self.load_pair(i, j)
     
     def __len__(self):
-        return len(self.imageFolderDataset.imgs)
+        return len(self.labels)
+
+class EpochPairStream(IterableDataset):
+    """Streams the pairs of an epoch plan of a SiameseNetworkDataset. Each DataLoader worker rebuilds the plan from
+    the seed and loads only its own contiguous shard of it, so workers never produce the same pair, and a run is
+    reproducible for a given seed and number of workers.
+    """
+
+    def __init__(self, dataset, epoch=0):
+        self.dataset = dataset
+        self.epoch = epoch
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        plan = self.dataset.pair_plan(self.epoch)
+        worker = get_worker_info()
+        if worker is not None:
+            bounds = np.linspace(0, len(plan), worker.num_workers + 1).astype(int)
+            plan = plan[bounds[worker.id]:bounds[worker.id + 1]]
+        for i, j, _ in plan.tolist():
+            yield self.dataset.load_pair(i, j)
+
+    def __len__(self):
+        return len(self.dataset)
+
+class BalancedBatchSampler(Sampler):
+    """Batch sampler for SiameseNetworkDataset that yields batches of (i, j) pairs, half of them from the same class
+    and half from different classes, with the classes of the anchors drawn uniformly whatever the number of images
+    per class. A whole batch is drawn with a few vectorized operations.
+
+    Use it as DataLoader(dataset, batch_sampler=BalancedBatchSampler(dataset, batch_size)).
+    """
+
+    def __init__(self, dataset, batch_size, n_batches=None, seed=None):
+        if len(dataset.classes) < 2:
+            raise ValueError("balanced batches need at least two classes")
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.n_batches = n_batches if n_batches is not None else max(1, len(dataset) // batch_size)
+        self.rng = np.random.default_rng(seed)
+
+    def _draw(self, classes):
+        """Uniformly random image of each of the given classes."""
+        start, count = self.dataset.class_start[classes], np.diff(self.dataset.class_start)[classes]
+        return self.dataset.by_class[start + (self.rng.random(len(classes)) * count).astype(np.int64)]
+
+    def __iter__(self):
+        n_classes = len(self.dataset.classes)
+        n_same = self.batch_size // 2
+        for _ in range(self.n_batches):
+            anchor_classes = self.rng.integers(n_classes, size=self.batch_size)
+            other_classes = anchor_classes.copy()
+            other_classes[n_same:] = (
+                anchor_classes[n_same:] + self.rng.integers(1, n_classes, size=self.batch_size - n_same)
+            ) % n_classes
+            anchors, partners = self._draw(anchor_classes), self._draw(other_classes)
+            yield list(zip(anchors.tolist(), partners.tolist()))
+
+    def __len__(self):
+        return self.n_batches
 
 ##### SET UP THE SIAMESE NETWORK #####
 
 class SiameseNetwork(nn.Module):
 
-    def __init__(self):
+    def __init__(self, single_pass=False, single_pass_max_batch=64):
         super(SiameseNetwork, self).__init__()
 
+        # Opt-in: run both images through the shared tower as one batch (see forward), for batches of up to
+        # single_pass_max_batch pairs. Above some size the stacked batch stops fitting in cache and two passes are
+        # faster again; where that is depends on the machine, so measure it with benchmark_siamese.py
+        self.single_pass = single_pass
+        self.single_pass_max_batch = single_pass_max_batch
+
         # Setting up the Sequential of CNN Layers
         self.cnn1 = nn.Sequential(
             nn.Conv2d(3, 96, kernel_size=11,stride=4),
@@ -113,8 +303,21 @@ class SiameseNetwork(nn.Module):
     def forward(self, input1, input2):
         # In this function we pass in both images and obtain both vectors
         # which are returned
-        output1 = self.forward_once(input1)
-        output2 = self.forward_once(input2)
+        return self.forward_pair(self.forward_once, input1, input2)
+
+    def forward_pair(self, tower, input1, input2):
+        """Runs tower on both batches of images, in a single pass if single_pass allows it. tower is forward_once, or
+        a traced copy of it (see siamese_inference.SiameseInference)."""
+        if self.single_pass and input1.shape == input2.shape and input1.size(0) <= self.single_pass_max_batch:
+            # Both branches share their weights, so stack the two batches and launch every kernel once on a batch
+            # twice as big instead of twice on half-size batches. No layer mixes samples, but the outputs only match
+            # the two pass version up to float rounding (BLAS may block a bigger batch differently), which is why the
+            # single pass is off by default
+            output = tower(torch.cat([input1, input2]))
+            return output[:input1.size(0)], output[input1.size(0):]
+
+        output1 = tower(input1)
+        output2 = tower(input2)
 
         return output1, output2
 
@@ -126,6 +329,12 @@ class ContrastiveLoss(torch.nn.Module):
         self.margin = margin
 
     def forward(self, output1, output2, label):
+      # Always computed in fp32, even inside a bf16 autocast region: the squared distances and the margin term lose
+      # too much precision in bf16
+      with torch.autocast(device_type=output1.device.type, enabled=False):
+        return self._forward(output1.float(), output2.float(), label.float())
+
+    def _forward(self, output1, output2, label):
       # Calculate the euclidian distance and calculate the contrastive loss
       euclidean_distance = F.pairwise_distance(output1, output2, keepdim = True)
 
@@ -133,4 +342,22 @@ class ContrastiveLoss(torch.nn.Module):
                                     (label) * torch.pow(torch.clamp(self.margin - euclidean_distance, min=0.0), 2))
 
 
-      return loss_contrastive
\ No newline at end of file
+      return loss_contrastive
+
+###### TRAINING STEP ######
+
+PRECISIONS = ('fp32', 'bf16')
+
+def train_step(net, criterion, optimizer, img0, img1, label, precision='fp32'):
+    """One optimization step on a batch of pairs. With precision='bf16' the forward pass of the network (cnn1 and
+    fc1) runs under CPU autocast in bfloat16, which uses the bf16 units of recent Xeons (AVX512-BF16, AMX); the
+    weights, their gradients and the optimizer state stay in fp32, and so does the loss. Returns the loss."""
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {PRECISIONS}, not {precision!r}")
+    optimizer.zero_grad()
+    with torch.autocast(device_type='cpu', dtype=torch.bfloat16, enabled=precision == 'bf16'):
+        output1, output2 = net(img0, img1)
+    loss_contrastive = criterion(output1, output2, label)
+    loss_contrastive.backward()
+    optimizer.step()
+    return loss_contrastive
@@ -1,6 +1,14 @@
+import base64
+import functools
+import struct
+import zlib
 import streamlit
 from streamlit_echarts import st_echarts
 import numpy as np
+import forward_mode
+import finite_differences
+import graph_layout
+import decision_grid
 
 def plot_interactive_parabola(x_values: np.array, a: float, b: float, c: float, y_minmax: list = [-20, 20]):
     y_values = a * x_values ** 2 + b * x_values + c
@@ -190,4 +198,409 @@ def plot_parabola_for_concept_of_derivative(x: float, h: float):
         ]
     }
 
-    st_echarts(options=option, width=600, height=500)
\ No newline at end of file
+    st_echarts(options=option, width=600, height=500)
+
+def plot_derivative_vs_finite_difference(h: float, function=test_parabola):
+    """Function that plots the exact derivative of a function next to its finite difference approximation with step
+    h. The exact curve comes from forward mode differentiation of the whole x grid at once.
+
+    :param h: Step of the finite difference approximation
+    :type h: float
+    :param function: Function to differentiate. Defaults to test_parabola
+    :type function: callable, optional
+    """
+    x_values = np.arange(-2, 2.05, 0.05)
+    y_values, exact_derivative = forward_mode.derivative(function, x_values)
+    numerical_derivative = (function(x_values + h) - y_values) / h
+
+    data_exact = [[x_val, y_val] for x_val, y_val in zip(x_values.tolist(), exact_derivative.tolist())]
+    data_numerical = [[x_val, y_val] for x_val, y_val in zip(x_values.tolist(), numerical_derivative.tolist())]
+
+    option = {
+        'title': {
+        'text': 'Exact derivative vs numerical approximation'
+        },
+        'legend': {
+        'data': ["f'(x)", f'(f(x + {h}) - f(x)) / {h}'],
+        'left': 'right',
+        'top': 'bottom'
+        },
+        'tooltip': {
+        'trigger': 'axis'
+        },
+        'xAxis': {
+        'type': 'value',
+        'nameLocation': 'middle',
+        'min': -2,
+        'max': 2
+        },
+        'yAxis': {
+        'type': 'value'
+        },
+        'series': [
+        {
+            'name': "f'(x)",
+            'type': 'line',
+            'data': data_exact,
+            'showSymbol': False,
+        },
+        {
+            'name': f'(f(x + {h}) - f(x)) / {h}',
+            'type': 'line',
+            'data': data_numerical,
+            'showSymbol': False,
+            'lineStyle': {'type': 'dashed'}
+        }
+        ]
+    }
+
+    st_echarts(options=option, width=600, height=500)
+
+@functools.lru_cache(maxsize=16)
+def finite_difference_error_surface(function, x_values: tuple, h_values: tuple) -> dict:
+    """Cached error surface of every finite difference scheme. Arguments are tuples so that the result can be reused
+    across reruns: moving the h slider or picking another x only reads a different slice of it.
+
+    :param function: Vectorized function of one variable.
+    :type function: callable
+    :param x_values: Points in which to differentiate.
+    :type x_values: tuple
+    :param h_values: Step sizes.
+    :type h_values: tuple
+    :return: Dictionary scheme -> array of absolute errors with shape (len(x_values), len(h_values)).
+    :rtype: dict
+    """
+    return finite_differences.difference_errors(function, np.array(x_values), np.array(h_values))
+
+def plot_finite_difference_convergence(x: float, x_options: list, h: float = None, function=test_parabola):
+    """Function that plots, on log-log axes, the error of each finite difference scheme at the point x against the
+    step h. Large steps show the truncation error of each scheme, tiny steps the round-off error.
+
+    :param x: Point in which the derivative is evaluated. Must be one of x_options.
+    :type x: float
+    :param x_options: Every x the page lets the user choose; the error surface is computed for all of them at once.
+    :type x_options: list
+    :param h: Step currently selected on the page, marked on the plot. Defaults to None
+    :type h: float or None, optional
+    :param function: Function to differentiate. Defaults to test_parabola
+    :type function: callable, optional
+    """
+    h_values = tuple(np.logspace(-16, 1, 69).tolist())
+    errors = finite_difference_error_surface(function, tuple(x_options), h_values)
+    row = x_options.index(x)
+
+    # Errors that are exactly zero can't be drawn on a log axis
+    floor = 1e-17
+    series = [
+        {
+            'name': scheme,
+            'type': 'line',
+            'data': [[h_val, max(err, floor)] for h_val, err in zip(h_values, errors[scheme][row].tolist())],
+            'showSymbol': False,
+        }
+        for scheme in finite_differences.SCHEMES
+    ]
+    if h is not None:
+        series[0]['markLine'] = {'symbol': 'none', 'data': [{'xAxis': h}]}
+
+    option = {
+        'title': {
+        'text': f'Error of the numerical derivative at x={x}'
+        },
+        'legend': {
+        'data': list(finite_differences.SCHEMES),
+        'left': 'right',
+        'top': 'bottom'
+        },
+        'tooltip': {
+        'trigger': 'axis'
+        },
+        'xAxis': {
+        'type': 'log',
+        'name': 'h',
+        'nameLocation': 'middle',
+        },
+        'yAxis': {
+        'type': 'log',
+        'name': 'absolute error',
+        'min': floor
+        },
+        'series': series
+    }
+
+    st_echarts(options=option, width=600, height=500)
+
+def plot_learning_rate_sweep(learning_rates: np.array, trajectories: np.array, vertex: float, n_shown: int = 6):
+    """Function that plots the result of a gradient descent sweep: a few trajectories from the first starting point,
+    and the final distance to the vertex (averaged over starting points) against the learning rate.
+
+    :param learning_rates: Learning rates of the sweep, shape (n_lrs,).
+    :type learning_rates: np.array
+    :param trajectories: Output of optimization_sweeps.sweep, shape (n_starts, n_lrs, n_steps + 1).
+    :type trajectories: np.array
+    :param vertex: x coordinate of the minimum.
+    :type vertex: float
+    :param n_shown: Number of learning rates whose trajectories are drawn. Defaults to 6
+    :type n_shown: int, optional
+    """
+    steps = list(range(trajectories.shape[2]))
+    shown = np.unique(np.linspace(0, len(learning_rates) - 1, n_shown).astype(int))
+
+    # Diverged runs can't be drawn, so clip them to the edge of the plot
+    clipped = np.nan_to_num(np.clip(trajectories[0], -10, 10), nan=10.)
+    trajectory_series = [
+        {
+            'name': f'lr={learning_rates[i]:.3g}',
+            'type': 'line',
+            'data': [[step, x_val] for step, x_val in zip(steps, clipped[i].tolist())],
+            'showSymbol': False,
+        }
+        for i in shown
+    ]
+
+    with np.errstate(invalid='ignore'):
+        final_distance = np.nanmean(np.minimum(np.abs(trajectories[:, :, -1] - vertex), 1e3), axis=0)
+    final_distance = np.nan_to_num(final_distance, nan=1e3)
+    data_distance = [[lr, max(dist, 1e-16)] for lr, dist in zip(learning_rates.tolist(), final_distance.tolist())]
+
+    option_trajectories = {
+        'title': {'text': 'x after every gradient descent step'},
+        'legend': {'data': [series['name'] for series in trajectory_series], 'top': 'bottom'},
+        'tooltip': {'trigger': 'axis'},
+        'xAxis': {'type': 'value', 'name': 'step', 'nameLocation': 'middle'},
+        'yAxis': {'type': 'value', 'min': -10, 'max': 10},
+        'series': trajectory_series
+    }
+    option_distance = {
+        'title': {'text': 'Final distance to the vertex'},
+        'tooltip': {'trigger': 'axis'},
+        'xAxis': {'type': 'value', 'name': 'learning rate', 'nameLocation': 'middle'},
+        'yAxis': {'type': 'log'},
+        'series': [{'type': 'line', 'data': data_distance, 'showSymbol': False}]
+    }
+
+    st_echarts(options=option_trajectories, width=600, height=500)
+    st_echarts(options=option_distance, width=600, height=500)
+
+# Width, in characters, of the 'data ... | grad ...' part of a node's text, so that node sizes don't depend on values
+_VALUE_TEXT_WIDTH = 34
+
+@functools.lru_cache(maxsize=32)
+def _computation_graph_option(layout: graph_layout.GraphLayout, labels: tuple) -> tuple:
+    """Everything of the computation graph chart that only depends on the layout: the chart options, the nodes without
+    their text (positions and sizes) and the op and label part of every node's text. Layouts are cached objects
+    themselves (see graph_layout), so this is computed once per graph structure."""
+    names = [''] * len(layout)
+    for name, group in labels:
+        names[group] = name
+
+    heads, nodes = [], []
+    for i, (op, count) in enumerate(zip(layout.ops, layout.counts.tolist())):
+        if layout.collapsed:
+            head = f"{op or 'leaf'} x{count}"
+        else:
+            head = ' '.join(part for part in (op, names[i]) if part)
+        heads.append(head + ' | ' if head else '')
+        nodes.append({
+            'id': str(i),
+            'x': float(layout.x[i]) * 200,
+            'y': float(layout.y[i]) * 50,
+            'symbolSize': [(len(heads[-1]) + _VALUE_TEXT_WIDTH) * 6 + 10, 24 + 4 * min(float(np.log2(count)), 6)],
+        })
+    links = [
+        {'source': str(src), 'target': str(dst), 'lineStyle': {'width': 1 + min(float(np.log2(count)), 4)}}
+        for (src, dst), count in zip(layout.edges.tolist(), layout.edge_counts.tolist())
+    ]
+
+    option = {
+        'title': {'text': 'Computation graph' + (' (collapsed)' if layout.collapsed else '')},
+        'tooltip': {},
+        'series': [
+        {
+            'type': 'graph',
+            'layout': 'none',
+            'roam': True,
+            'symbol': 'rect',
+            'label': {'show': True, 'fontSize': 10, 'color': '#000000'},
+            'itemStyle': {'color': '#ffffff', 'borderColor': '#333333', 'borderWidth': 1},
+            'edgeSymbol': ['none', 'arrow'],
+            'edgeSymbolSize': 6,
+            'links': links,
+        }
+        ]
+    }
+    return option, nodes, heads
+
+def plot_computation_graph(root, labels: dict = None, max_nodes: int = 300, height: int = 500):
+    """Function that draws the computation graph of a compact_engine Value, like micrograd's draw_dot: one box per
+    node with its op, value and gradient. The layout and every part of the chart that only depends on it (positions,
+    sizes, edges) are cached per graph structure (see graph_layout and _computation_graph_option), so a rerun only
+    formats the values and gradients into the cached nodes; the chart is keyed by the structure, so the browser
+    updates the existing chart in place with the new texts instead of mounting a new one.
+    Graphs with more than max_nodes nodes are drawn collapsed, one box per group of nodes with the same op in the same
+    column, showing their count, mean value and mean absolute gradient.
+
+    :param root: Output of the graph.
+    :type root: compact_engine.Value
+    :param labels: Name -> Value of the nodes to label, like the names returned by example_graphs. Defaults to None
+    :type labels: dict, optional
+    :param max_nodes: Largest number of nodes drawn one by one. Defaults to 300
+    :type max_nodes: int, optional
+    :param height: Height of the chart in pixels. Defaults to 500
+    :type height: int, optional
+    """
+    layout = graph_layout.graph_layout(root, max_nodes)
+    graph, n = root.graph, root.idx + 1
+    data = np.frombuffer(graph.data, dtype=np.float64, count=n)
+    grad = np.frombuffer(graph.grad, dtype=np.float64, count=n)
+
+    drawn = layout.group >= 0
+    counts = np.maximum(layout.counts, 1)
+    mean_data = (np.bincount(layout.group[drawn], weights=data[drawn], minlength=len(layout)) / counts).tolist()
+    mean_grad = (np.bincount(layout.group[drawn], weights=np.abs(grad[drawn]) if layout.collapsed else grad[drawn],
+                             minlength=len(layout)) / counts).tolist()
+
+    label_groups = () if layout.collapsed else tuple(sorted(
+        (name, int(layout.group[v.idx])) for name, v in (labels or {}).items()
+        if v.idx < n and layout.group[v.idx] >= 0
+    ))
+    option, nodes, heads = _computation_graph_option(layout, label_groups)
+    grad_name = '|grad|' if layout.collapsed else 'grad'
+    series = dict(option['series'][0], data=[
+        dict(node, name=f"{head}data {value:.4f} | {grad_name} {gradient:.4f}")
+        for node, head, value, gradient in zip(nodes, heads, mean_data, mean_grad)
+    ])
+
+    st_echarts(options=dict(option, series=[series]), width=600, height=height, key=f'computation-graph-{layout.key}')
+
+def _png_data_uri(rgb: np.ndarray) -> str:
+    """Encodes an (height, width, 3) uint8 image as a PNG data URI that echarts can draw."""
+    height, width, _ = rgb.shape
+    # Every scanline starts with its filter type, 0 (none)
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgb.reshape(height, -1)], axis=1).tobytes()
+
+    def chunk(tag: bytes, payload: bytes) -> bytes:
+        return struct.pack('>I', len(payload)) + tag + payload + struct.pack('>I', zlib.crc32(tag + payload))
+
+    png = (
+        b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+        chunk(b'IDAT', zlib.compress(raw, 6)) + chunk(b'IEND', b'')
+    )
+    return 'data:image/png;base64,' + base64.b64encode(png).decode()
+
+@functools.lru_cache(maxsize=8)
+def _decision_grid(bounds: tuple, resolution: int) -> decision_grid.DecisionGrid:
+    """Evaluator shared by every draw of the same region, so that its tile cache survives reruns."""
+    return decision_grid.DecisionGrid(bounds, resolution)
+
+def plot_decision_boundary(predict, X: np.ndarray, y: np.ndarray, resolution: int = 500, version: str = None,
+                           key: str = None):
+    """Function that plots the scores of a 2-D classifier on a grid around the data, with the data points on top.
+    The grid is evaluated coarse to fine with decision_grid, and drawn as a single image below the data points.
+
+    :param predict: Maps points of shape (n, 2) to scores of shape (n,), positive for class 1.
+    :type predict: callable
+    :param X: Data points, shape (n_samples, 2).
+    :type X: np.ndarray
+    :param y: Labels in {-1, 1}, shape (n_samples,).
+    :type y: np.ndarray
+    :param resolution: Grid points along each axis. Defaults to 500
+    :type resolution: int, optional
+    :param version: Version of the model's parameters (decision_grid.parameter_version); grid tiles already
+    evaluated for this version are reused. Defaults to None (no caching)
+    :type version: str, optional
+    :param key: Streamlit key of the chart. Defaults to None
+    :type key: str, optional
+    """
+    x_min, y_min = np.round(X.min(axis=0) - 0.5, 2).tolist()
+    x_max, y_max = np.round(X.max(axis=0) + 0.5, 2).tolist()
+    scores = _decision_grid((x_min, x_max, y_min, y_max), resolution).evaluate(predict, version)
+
+    # White on the boundary, red for class -1 and blue for class 1; the image's first row is the top of the plot
+    s = np.clip(scores[::-1], -1, 1)[..., None]
+    white, red, blue = np.array([255., 255., 255.]), np.array([244., 163., 163.]), np.array([163., 196., 244.])
+    rgb = np.where(s < 0, white + (red - white) * -s, white + (blue - white) * s).astype(np.uint8)
+
+    width, height = 600, 500
+    grid = {'left': 50, 'right': 30, 'top': 60, 'bottom': 60}
+    option = {
+        'title': {'text': 'Decision boundary'},
+        'legend': {'data': ['class -1', 'class 1'], 'left': 'right', 'top': 'bottom'},
+        'grid': grid,
+        'xAxis': {'type': 'value', 'min': x_min, 'max': x_max},
+        'yAxis': {'type': 'value', 'min': y_min, 'max': y_max},
+        'graphic': [
+        {
+            'type': 'image',
+            'left': grid['left'],
+            'top': grid['top'],
+            'z': -10,
+            'silent': True,
+            'style': {
+                'image': _png_data_uri(rgb),
+                'width': width - grid['left'] - grid['right'],
+                'height': height - grid['top'] - grid['bottom']
+            }
+        }
+        ],
+        'series': [
+        {
+            'name': 'class -1',
+            'type': 'scatter',
+            'symbolSize': 6,
+            'itemStyle': {'color': '#c0392b'},
+            'data': X[y < 0].round(3).tolist(),
+        },
+        {
+            'name': 'class 1',
+            'type': 'scatter',
+            'symbolSize': 6,
+            'itemStyle': {'color': '#2e6fd1'},
+            'data': X[y > 0].round(3).tolist(),
+        }
+        ]
+    }
+
+    st_echarts(options=option, width=width, height=height, key=key)
+
+def plot_training_curve(history: list, max_points: int = 500, key: str = None):
+    """Function that plots the loss and the minibatch accuracy of a training run against the step. Long histories are
+    subsampled to max_points, so redrawing the curve costs the same after 100 steps or after 100 000.
+
+    :param history: (step, loss, accuracy) of every training step.
+    :type history: list
+    :param max_points: Largest number of points drawn per curve. Defaults to 500
+    :type max_points: int, optional
+    :param key: Streamlit key of the chart. Defaults to None
+    :type key: str, optional
+    """
+    stride = max(1, -(-len(history) // max_points))
+    shown = history[::stride]
+    if history and shown[-1] is not history[-1]:
+        shown.append(history[-1])
+
+    option = {
+        'title': {'text': 'Training loss'},
+        'legend': {'data': ['loss', 'accuracy'], 'left': 'right', 'top': 'bottom'},
+        'tooltip': {'trigger': 'axis'},
+        'xAxis': {'type': 'value', 'name': 'step', 'nameLocation': 'middle', 'min': 0},
+        'yAxis': [{'type': 'value', 'name': 'loss', 'min': 0}, {'type': 'value', 'name': 'accuracy', 'min': 0, 'max': 1}],
+        'series': [
+        {
+            'name': 'loss',
+            'type': 'line',
+            'data': [[step, round(loss, 5)] for step, loss, _ in shown],
+            'showSymbol': False,
+        },
+        {
+            'name': 'accuracy',
+            'type': 'line',
+            'yAxisIndex': 1,
+            'data': [[step, accuracy] for step, _, accuracy in shown],
+            'showSymbol': False,
+            'lineStyle': {'type': 'dashed'}
+        }
+        ]
+    }
+
+    st_echarts(options=option, width=600, height=300, key=key)
@@ -0,0 +1,147 @@
+import numpy as np
+from tensor_engine import Tape
+
+
+def _flatten(arrays: list) -> np.ndarray:
+    return np.concatenate([np.ravel(a) for a in arrays])
+
+def _unflatten(flat: np.ndarray, like: list) -> list:
+    out, start = [], 0
+    for a in like:
+        out.append(flat[start:start + a.size].reshape(a.shape))
+        start += a.size
+    return out
+
+
+def gradient_and_hvp(tape: Tape, parameters: list, vectors: list, h: float = 1e-20) -> tuple:
+    """Gradient and Hessian-vector product of the tape's (scalar) root in a single backward pass, by complex step
+    differentiation of the gradient itself: for theta + i*h*v,
+
+        grad(theta + i*h*v) = grad(theta) + i*h*H(theta) v + O(h^2)
+
+    so the real part of the gradient is the gradient and its imaginary part divided by h is H v. There is no
+    subtraction, hence no cancellation error, and h can be tiny: both are exact to machine precision.
+
+    The parameters are restored afterwards and their .grad holds the (real) gradient.
+
+    :param tape: Tape of the loss.
+    :type tape: Tape
+    :param parameters: Leaf Tensors of the tape.
+    :type parameters: list
+    :param vectors: One direction array per parameter, with the shapes of the parameters.
+    :type vectors: list
+    :param h: Size of the complex step. Defaults to 1e-20
+    :type h: float, optional
+    :return: Tuple (gradients, hessian_vector_products), each a list of arrays with the shapes of the parameters.
+    :rtype: tuple
+    """
+    originals = [p.data for p in parameters]
+    try:
+        for p, data, v in zip(parameters, originals, vectors):
+            p.data = data + 1j * h * np.asarray(v)
+        tape.forward()
+        tape.backward()
+        gradients = [np.real(p.grad).copy() for p in parameters]
+        products = [np.imag(p.grad) / h for p in parameters]
+    finally:
+        for p, data in zip(parameters, originals):
+            p.data = data
+        tape.forward()
+    for p, grad in zip(parameters, gradients):
+        p.grad = grad
+    return gradients, products
+
+
+def hessian_vector_product(tape: Tape, parameters: list, vectors: list, h: float = 1e-20) -> list:
+    """Hessian of the tape's root times vectors. See gradient_and_hvp.
+
+    :param tape: Tape of the loss.
+    :type tape: Tape
+    :param parameters: Leaf Tensors of the tape.
+    :type parameters: list
+    :param vectors: One direction array per parameter, with the shapes of the parameters.
+    :type vectors: list
+    :param h: Size of the complex step. Defaults to 1e-20
+    :type h: float, optional
+    :return: One array per parameter.
+    :rtype: list
+    """
+    return gradient_and_hvp(tape, parameters, vectors, h)[1]
+
+
+def gradient_and_hessian(tape: Tape, parameters: list) -> tuple:
+    """Flat gradient and full Hessian with respect to all the parameters, one Hessian-vector product per parameter
+    entry. Meant for the small problems of the pages (a parabola, a small MLP).
+
+    :param tape: Tape of the loss.
+    :type tape: Tape
+    :param parameters: Leaf Tensors of the tape.
+    :type parameters: list
+    :return: Tuple (gradient of shape (P,), Hessian of shape (P, P)), P being the total number of parameter entries.
+    :rtype: tuple
+    """
+    like = [p.data for p in parameters]
+    n = sum(a.size for a in like)
+    H = np.empty((n, n))
+    gradient = None
+    for i in range(n):
+        unit = np.zeros(n)
+        unit[i] = 1.0
+        grads, products = gradient_and_hvp(tape, parameters, _unflatten(unit, like))
+        H[:, i] = _flatten(products)
+        if gradient is None:
+            gradient = _flatten(grads)
+    # Symmetric up to round-off; make it exactly symmetric
+    return gradient, (H + H.T) / 2
+
+
+class Newton:
+    """Newton's method on the parameters of a tape: every step solves H d = g and moves the parameters by -d, which
+    lands on the vertex of a parabola (any quadratic) in a single step.
+
+    With damping > 0 it becomes damped Newton (Levenberg-Marquardt): it solves (H + damping * I) d = g instead, and
+    adapts the damping after every step, dividing it by 10 when the loss went down and multiplying it by 10 (and
+    retrying) when it didn't. That keeps it stable far from the minimum or where H is not positive definite, like
+    the loss of an MLP, while still converging like Newton close to the minimum.
+    """
+
+    def __init__(self, tape: Tape, parameters: list, damping: float = 0.0, max_retries: int = 20):
+        self.tape = tape
+        self.parameters = parameters
+        self.damping = damping
+        self.max_retries = max_retries
+
+    def _solve(self, H: np.ndarray, g: np.ndarray, damping: float) -> np.ndarray:
+        A = H + damping * np.eye(len(g))
+        try:
+            return np.linalg.solve(A, g)
+        except np.linalg.LinAlgError:
+            return np.linalg.lstsq(A, g, rcond=None)[0]
+
+    def _move(self, direction: np.ndarray, scale: float):
+        for p, d in zip(self.parameters, _unflatten(direction, [p.data for p in self.parameters])):
+            p.data = p.data - scale * d
+
+    def step(self) -> float:
+        """Takes one (damped) Newton step.
+
+        :return: Loss after the step.
+        :rtype: float
+        """
+        g, H = gradient_and_hessian(self.tape, self.parameters)
+        loss_before = float(np.real(self.tape.root.data))
+
+        if self.damping == 0:
+            self._move(self._solve(H, g, 0.0), 1.0)
+            return float(self.tape.forward().data)
+
+        for _ in range(self.max_retries):
+            direction = self._solve(H, g, self.damping)
+            self._move(direction, 1.0)
+            loss = float(self.tape.forward().data)
+            if loss < loss_before:
+                self.damping = max(self.damping / 10, 1e-12)
+                return loss
+            self._move(direction, -1.0)
+            self.damping *= 10
+        return float(self.tape.forward().data)
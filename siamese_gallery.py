@@ -0,0 +1,218 @@
+import numpy as np
+import torch
+
+# Upper bound on the number of query x gallery distances held in memory at once
+MAX_DISTANCES_PER_CHUNK = 16 * 2**20
+
+
+class EmbeddingGallery:
+    """Identification against a gallery of enrolled images with a SiameseNetwork. Every enrolled image goes through the
+    shared tower once, and its embedding is kept in a contiguous float32 matrix along with its label. A query is then
+    answered with one forward pass for the query images and one matrix product against the whole gallery, instead of
+    running both branches of the network for every (query, gallery image) pair.
+
+    Distances are the euclidean distances ContrastiveLoss is trained on, computed as |q|^2 + |g|^2 - 2 q.g with the
+    squared norms of the gallery kept next to the embeddings.
+    """
+
+    def __init__(self, embed=None, dim: int = 2, capacity: int = 1024):
+        """
+        :param embed: Maps images of shape (batch, 3, 100, 100) to embeddings of shape (batch, dim), e.g.
+        SiameseInference(model).embed or model.forward_once. Only needed to enroll or search images; a gallery can
+        be searched with precomputed embeddings without it. Defaults to None
+        :type embed: callable, optional
+        :param dim: Size of the embeddings. Defaults to 2 (the output of SiameseNetwork)
+        :type dim: int, optional
+        :param capacity: Number of embeddings allocated up front; the storage doubles when it is full. Defaults to 1024
+        :type capacity: int, optional
+        """
+        self.embed = embed
+        self.dim = dim
+        self.size = 0
+        self._embeddings = np.empty((max(capacity, 1), dim), dtype=np.float32)
+        self._norms = np.empty(max(capacity, 1), dtype=np.float32)
+        self._labels = np.empty(max(capacity, 1), dtype=np.int64)
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self._embeddings[:self.size]
+
+    @property
+    def labels(self) -> np.ndarray:
+        return self._labels[:self.size]
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return f"EmbeddingGallery(size={self.size}, dim={self.dim})"
+
+    def _grow(self, n: int):
+        capacity = max(2 * len(self._embeddings), self.size + n)
+        # Also turns a gallery loaded read-only from disk into an in-memory one
+        for name in ('_embeddings', '_norms', '_labels'):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def _embed(self, images) -> np.ndarray:
+        if self.embed is None:
+            raise ValueError("this gallery has no embed function, pass one to the constructor or to load")
+        with torch.inference_mode():
+            embeddings = self.embed(torch.as_tensor(images))
+        return embeddings.float().numpy()
+
+    def add_embeddings(self, embeddings: np.ndarray, labels) -> np.ndarray:
+        """Adds precomputed embeddings to the gallery.
+
+        :param embeddings: Embeddings with shape (n, dim).
+        :type embeddings: np.ndarray
+        :param labels: Label (class or identity) of every embedding, shape (n,).
+        :type labels: array_like
+        :return: Gallery indices of the new embeddings.
+        :rtype: np.ndarray
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        labels = np.asarray(labels, dtype=np.int64).reshape(-1)
+        if len(embeddings) != len(labels):
+            raise ValueError(f"got {len(embeddings)} embeddings but {len(labels)} labels")
+        n = len(embeddings)
+        if self.size + n > len(self._embeddings) or not self._embeddings.flags.writeable:
+            self._grow(n)
+        self._embeddings[self.size:self.size + n] = embeddings
+        self._norms[self.size:self.size + n] = np.einsum('ij,ij->i', embeddings, embeddings)
+        self._labels[self.size:self.size + n] = labels
+        self.size += n
+        return np.arange(self.size - n, self.size)
+
+    def enroll(self, images, labels, batch_size: int = 256) -> np.ndarray:
+        """Embeds images with one forward pass of the tower per batch and adds them to the gallery.
+
+        :param images: Images with shape (n, 3, 100, 100), a tensor or an array (an ImageStore's uint8 images should
+        be divided by 255 first).
+        :type images: torch.Tensor or np.ndarray
+        :param labels: Label (class or identity) of every image, shape (n,).
+        :type labels: array_like
+        :param batch_size: Images per forward pass. Defaults to 256
+        :type batch_size: int, optional
+        :return: Gallery indices of the new images.
+        :rtype: np.ndarray
+        """
+        embeddings = np.concatenate([
+            self._embed(images[start:start + batch_size]) for start in range(0, len(images), batch_size)
+        ]) if len(images) else np.empty((0, self.dim), dtype=np.float32)
+        return self.add_embeddings(embeddings, labels)
+
+    def enroll_store(self, store, batch_size: int = 256) -> np.ndarray:
+        """Enrolls every image of an ImageStore with its label, reading the mapped file one batch at a time.
+
+        :param store: Images written by phantom_lib.preprocess_image_folder.
+        :type store: phantom_lib.ImageStore
+        :param batch_size: Images per forward pass. Defaults to 256
+        :type batch_size: int, optional
+        :return: Gallery indices of the new images.
+        :rtype: np.ndarray
+        """
+        embeddings = [
+            self._embed(store[start:start + batch_size] / np.float32(255)) for start in range(0, len(store), batch_size)
+        ]
+        return self.add_embeddings(np.concatenate(embeddings) if embeddings else np.empty((0, self.dim)), store.labels)
+
+    def search_embeddings(self, queries: np.ndarray, k: int = 5) -> tuple:
+        """The k nearest gallery embeddings of every query embedding.
+
+        :param queries: Query embeddings with shape (n_queries, dim).
+        :type queries: np.ndarray
+        :param k: Number of neighbours. Defaults to 5 (fewer when the gallery is smaller)
+        :type k: int, optional
+        :return: Tuple (distances, indices), both with shape (n_queries, k) and sorted by increasing distance.
+        :rtype: tuple
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        k = min(k, self.size)
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        if k == 0:
+            return distances, indices
+
+        embeddings, norms = self.embeddings, self._norms[:self.size]
+        # Queries are processed in chunks so that the distance matrix stays bounded for a large gallery
+        chunk = max(1, MAX_DISTANCES_PER_CHUNK // self.size)
+        for start in range(0, len(queries), chunk):
+            q = queries[start:start + chunk]
+            squared = np.einsum('ij,ij->i', q, q)[:, None] + norms[None, :]
+            squared -= 2 * (q @ embeddings.T)
+            if k < self.size:
+                nearest = np.argpartition(squared, k - 1, axis=1)[:, :k]
+            else:
+                nearest = np.broadcast_to(np.arange(self.size), squared.shape)
+            nearest_squared = np.take_along_axis(squared, nearest, axis=1)
+            order = np.argsort(nearest_squared, axis=1, kind='stable')
+            indices[start:start + chunk] = np.take_along_axis(nearest, order, axis=1)
+            # Rounding can make the squared distance of near duplicates slightly negative
+            distances[start:start + chunk] = np.sqrt(np.maximum(np.take_along_axis(nearest_squared, order, axis=1), 0))
+        return distances, indices
+
+    def search(self, images, k: int = 5) -> tuple:
+        """The k nearest gallery images of every query image.
+
+        :param images: Query images with shape (n_queries, 3, 100, 100).
+        :type images: torch.Tensor or np.ndarray
+        :param k: Number of neighbours. Defaults to 5
+        :type k: int, optional
+        :return: Tuple (distances, indices), both with shape (n_queries, k) and sorted by increasing distance; the
+        labels of the neighbours are gallery.labels[indices].
+        :rtype: tuple
+        """
+        return self.search_embeddings(self._embed(images), k)
+
+    def identify(self, images, threshold: float = None) -> tuple:
+        """Label of the nearest gallery image of every query image.
+
+        :param images: Query images with shape (n_queries, 3, 100, 100).
+        :type images: torch.Tensor or np.ndarray
+        :param threshold: Largest distance accepted as a match; queries farther than that from every gallery image
+        get the label -1. Defaults to None (always take the nearest)
+        :type threshold: float, optional
+        :return: Tuple (labels, distances), both with shape (n_queries,).
+        :rtype: tuple
+        """
+        distances, indices = self.search(images, k=1)
+        if self.size == 0:
+            return np.full(len(distances), -1, dtype=np.int64), np.full(len(distances), np.inf, dtype=np.float32)
+        labels, distances = self.labels[indices[:, 0]], distances[:, 0]
+        if threshold is not None:
+            labels = np.where(distances <= threshold, labels, -1)
+        return labels, distances
+
+    def save(self, path: str):
+        """Writes the gallery to path.embeddings.npy and path.labels.npy.
+
+        :param path: Prefix of the files.
+        :type path: str
+        """
+        np.save(path + '.embeddings.npy', self.embeddings)
+        np.save(path + '.labels.npy', self.labels)
+
+    @classmethod
+    def load(cls, path: str, embed=None, mmap: bool = True) -> 'EmbeddingGallery':
+        """Opens a gallery written by save. With mmap, the embeddings are memory-mapped read-only, so several
+        processes serving the same gallery share its pages; enrolling more images copies it into memory first.
+
+        :param path: Prefix of the files.
+        :type path: str
+        :param embed: See the constructor. Defaults to None
+        :type embed: callable, optional
+        :param mmap: Map the embeddings instead of reading them. Defaults to True
+        :type mmap: bool, optional
+        :return: The gallery.
+        :rtype: EmbeddingGallery
+        """
+        embeddings = np.load(path + '.embeddings.npy', mmap_mode='r' if mmap else None)
+        gallery = cls(embed, dim=embeddings.shape[1], capacity=1)
+        gallery._embeddings = embeddings
+        gallery._norms = np.einsum('ij,ij->i', embeddings, embeddings)
+        gallery._labels = np.load(path + '.labels.npy')
+        gallery.size = len(embeddings)
+        return gallery
@@ -0,0 +1,242 @@
+import copy
+import io
+import time
+import warnings
+from collections import deque
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from phantom_lib import ContrastiveLoss, SiameseNetwork, PRECISIONS
+
+IMAGE_SHAPE = (3, 100, 100)
+
+
+def configure_threads(intra_op_threads: int = None, inter_op_threads: int = None):
+    """Pins the number of threads torch uses inside an op (intra-op) and to run independent ops (inter-op). On a
+    serving box running several replicas, each replica should get its share of the cores instead of all of them.
+
+    The inter-op pool can only be sized before torch first uses it; after that a warning is issued and the current
+    size is kept.
+
+    :param intra_op_threads: Threads per op. Defaults to None (keep torch's default)
+    :type intra_op_threads: int, optional
+    :param inter_op_threads: Threads running independent ops. Defaults to None (keep torch's default)
+    :type inter_op_threads: int, optional
+    """
+    if intra_op_threads is not None:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads is not None and inter_op_threads != torch.get_num_interop_threads():
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError:
+            warnings.warn(
+                f'inter-op threads are already in use, keeping {torch.get_num_interop_threads()} instead of '
+                f'{inter_op_threads}'
+            )
+
+
+def quantize_fc1(model: SiameseNetwork) -> SiameseNetwork:
+    """Copy of a network with the nn.Linear layers of fc1 dynamically quantized to int8: the weights are stored as
+    int8 with a per-tensor scale, and the activations are quantized on the fly at every call. cnn1 stays in fp32.
+
+    :param model: Trained network; it is not modified.
+    :type model: SiameseNetwork
+    :return: The quantized copy, in eval mode.
+    :rtype: SiameseNetwork
+    """
+    quantized = copy.deepcopy(model).eval()
+    # Eager mode quantization is deprecated in recent torch releases in favour of torchao, which isn't a dependency
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        warnings.simplefilter('ignore', UserWarning)
+        quantized.fc1 = torch.ao.quantization.quantize_dynamic(quantized.fc1, {nn.Linear}, dtype=torch.qint8)
+    return quantized
+
+
+def model_size_bytes(module: nn.Module) -> int:
+    """Size of a module's serialized state_dict, i.e. what a replica has to load.
+
+    :param module: Any module (or submodule, like model.fc1).
+    :type module: nn.Module
+    :return: Size in bytes.
+    :rtype: int
+    """
+    buffer = io.BytesIO()
+    torch.save(module.state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
+
+class _Tower(nn.Module):
+    """The shared branch of a SiameseNetwork as a module of its own, so that it can be traced."""
+
+    def __init__(self, model: SiameseNetwork):
+        super(_Tower, self).__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model.forward_once(x)
+
+
+class SiameseInference:
+    """CPU inference wrapper for a trained SiameseNetwork. The shared tower is put in eval mode, traced and frozen
+    with TorchScript (weights become constants, and conv/ReLU/linear chains are fused), and every call runs under
+    torch.inference_mode, so no autograd bookkeeping is done. The latency of every call is recorded; see
+    latency_report.
+    """
+
+    def __init__(self, model: SiameseNetwork, freeze: bool = True, quantize: bool = False, precision: str = 'fp32',
+                 intra_op_threads: int = None, inter_op_threads: int = None, example_batch_size: int = 2,
+                 max_latencies: int = 10_000):
+        """
+        :param model: Trained network. The wrapper serves an eval mode copy of it, so model itself keeps its mode.
+        :type model: SiameseNetwork
+        :param freeze: Trace and freeze the tower with TorchScript. Defaults to True
+        :type freeze: bool, optional
+        :param quantize: Serve an int8 copy of the network with quantize_fc1 (model itself is left in fp32). See
+        quantization_report for what it costs in accuracy. Defaults to False
+        :type quantize: bool, optional
+        :param precision: 'fp32', or 'bf16' to run the tower under CPU autocast in bfloat16 (embeddings are still
+        returned in fp32). Defaults to 'fp32'
+        :type precision: str, optional
+        :param intra_op_threads: See configure_threads. Defaults to None
+        :type intra_op_threads: int, optional
+        :param inter_op_threads: See configure_threads. Defaults to None
+        :type inter_op_threads: int, optional
+        :param example_batch_size: Batch size of the example input used to trace the tower. Defaults to 2
+        :type example_batch_size: int, optional
+        :param max_latencies: Number of most recent call latencies kept. Defaults to 10 000
+        :type max_latencies: int, optional
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {PRECISIONS}, not {precision!r}")
+        configure_threads(intra_op_threads, inter_op_threads)
+        self.precision = precision
+        self.model = quantize_fc1(model) if quantize else copy.deepcopy(model).eval()
+        tower = _Tower(self.model).eval()
+        if freeze:
+            # TorchScript is deprecated in recent torch releases in favour of torch.compile, but it is still the
+            # cheapest way to get a frozen graph without a compiler toolchain on the serving box
+            with torch.no_grad(), warnings.catch_warnings():
+                warnings.simplefilter('ignore', FutureWarning)
+                traced = torch.jit.trace(tower, torch.randn(example_batch_size, *IMAGE_SHAPE))
+                tower = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+        self.tower = tower
+        self.latencies = deque(maxlen=max_latencies)
+
+    def _tower(self, images):
+        # The tower is traced in fp32; under autocast the frozen graph runs its convolutions and matmuls in bf16
+        with torch.autocast(device_type='cpu', dtype=torch.bfloat16, enabled=self.precision == 'bf16'):
+            return self.tower(images).float()
+
+    def __call__(self, input1, input2) -> tuple:
+        """Embeddings of both images of every pair, like SiameseNetwork.forward.
+
+        :param input1: First images, shape (batch, 3, 100, 100).
+        :type input1: torch.Tensor
+        :param input2: Second images, shape (batch, 3, 100, 100).
+        :type input2: torch.Tensor
+        :return: Tuple (output1, output2) of embeddings with shape (batch, 2).
+        :rtype: tuple
+        """
+        start = time.perf_counter()
+        with torch.inference_mode():
+            output = self.model.forward_pair(self._tower, input1, input2)
+        self.latencies.append(time.perf_counter() - start)
+        return output
+
+    def embed(self, images) -> torch.Tensor:
+        """Embeddings of a batch of images.
+
+        :param images: Images, shape (batch, 3, 100, 100).
+        :type images: torch.Tensor
+        :return: Embeddings with shape (batch, 2).
+        :rtype: torch.Tensor
+        """
+        start = time.perf_counter()
+        with torch.inference_mode():
+            output = self._tower(images)
+        self.latencies.append(time.perf_counter() - start)
+        return output
+
+    def distance(self, input1, input2) -> torch.Tensor:
+        """Euclidean distance between the embeddings of every pair, the quantity ContrastiveLoss is built on.
+
+        :param input1: First images, shape (batch, 3, 100, 100).
+        :type input1: torch.Tensor
+        :param input2: Second images, shape (batch, 3, 100, 100).
+        :type input2: torch.Tensor
+        :return: Distances with shape (batch,).
+        :rtype: torch.Tensor
+        """
+        output1, output2 = self(input1, input2)
+        return F.pairwise_distance(output1, output2)
+
+    def latency_report(self) -> dict:
+        """Latency percentiles of the recorded calls.
+
+        :return: Dictionary with calls, p50_ms, p99_ms and mean_ms (None when nothing was recorded).
+        :rtype: dict
+        """
+        return latency_percentiles(self.latencies)
+
+
+def latency_percentiles(latencies) -> dict:
+    """p50, p99 and mean of a list of latencies in seconds.
+
+    :param latencies: Latencies in seconds.
+    :type latencies: iterable
+    :return: Dictionary with calls, p50_ms, p99_ms and mean_ms (None when latencies is empty).
+    :rtype: dict
+    """
+    latencies = np.asarray(latencies, dtype=np.float64) * 1e3
+    if len(latencies) == 0:
+        return {'calls': 0, 'p50_ms': None, 'p99_ms': None, 'mean_ms': None}
+    p50, p99 = np.percentile(latencies, [50, 99]).tolist()
+    return {'calls': len(latencies), 'p50_ms': p50, 'p99_ms': p99, 'mean_ms': float(latencies.mean())}
+
+
+def quantization_report(model: SiameseNetwork, input1, input2, label, n_calls: int = 50, margin: float = 2.0) -> dict:
+    """Compares the fp32 network against its int8 copy from quantize_fc1, both behind a frozen SiameseInference, on a
+    batch of pairs: how far the embedding distances drift, the ContrastiveLoss of each, their sizes and latencies.
+    Pass real validation pairs; random images say little about the drift on actual data.
+
+    :param model: Trained network.
+    :type model: SiameseNetwork
+    :param input1: First images of the pairs, shape (batch, 3, 100, 100).
+    :type input1: torch.Tensor
+    :param input2: Second images of the pairs, shape (batch, 3, 100, 100).
+    :type input2: torch.Tensor
+    :param label: Labels of the pairs (0 same class, 1 different), shape (batch, 1).
+    :type label: torch.Tensor
+    :param n_calls: Timed calls per variant. Defaults to 50
+    :type n_calls: int, optional
+    :param margin: Margin of the ContrastiveLoss. Defaults to 2.0
+    :type margin: float, optional
+    :return: Dictionary with 'fp32' and 'int8' entries (loss, size_bytes, fc1_size_bytes and latency percentiles)
+    and a 'distance_drift' entry (mean_abs, max_abs and mean_relative difference of the pair distances).
+    :rtype: dict
+    """
+    criterion = ContrastiveLoss(margin)
+    report, distances = {}, {}
+    for name, quantize in (('fp32', False), ('int8', True)):
+        inference = SiameseInference(model, quantize=quantize)
+        output1, output2 = inference(input1, input2)
+        distances[name] = F.pairwise_distance(output1, output2)
+        inference.latencies.clear()
+        for _ in range(n_calls):
+            inference(input1, input2)
+        report[name] = {
+            'loss': float(criterion(output1, output2, label)),
+            'size_bytes': model_size_bytes(inference.model),
+            'fc1_size_bytes': model_size_bytes(inference.model.fc1),
+            **inference.latency_report(),
+        }
+
+    drift = (distances['int8'] - distances['fp32']).abs()
+    report['distance_drift'] = {
+        'mean_abs': float(drift.mean()),
+        'max_abs': float(drift.max()),
+        'mean_relative': float((drift / distances['fp32'].clamp(min=1e-12)).mean()),
+    }
+    return report
@@ -0,0 +1,286 @@
+"""Asyncio micro-batching service for the Siamese network of phantom_lib.
+
+Requests (a pair to score, or an image to embed) are queued and flushed as a single forward pass when max_batch_size
+items are waiting or the oldest one has waited max_wait_ms, whichever comes first. The forward pass runs on a worker
+thread, so the event loop keeps accepting requests while the network is busy.
+
+The load generator sends requests at a given rate (Poisson arrivals) and reports throughput and latency for every
+(max_batch_size, max_wait_ms) setting, to pick the ones that suit the traffic:
+
+    python siamese_server.py --rate 200 --duration 5 --batch-sizes 1 8 32 --waits 0 2 5 --output server_tuning.json
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+import torch.nn.functional as F
+from phantom_lib import SiameseNetwork
+from siamese_inference import IMAGE_SHAPE, SiameseInference, latency_percentiles
+
+
+class MicroBatchServer:
+    """Queues pair and embedding requests from many coroutines and answers them in batches. Every image of a batch
+    (both images of every pair, and every image to embed) goes through the shared tower in one call of embed.
+
+    Use it as an async context manager, or call start and stop:
+
+        async with MicroBatchServer(SiameseInference(model).embed) as server:
+            distance = await server.score(img0, img1)
+    """
+
+    def __init__(self, embed, max_batch_size: int = 32, max_wait_ms: float = 2.0, max_latencies: int = 10_000):
+        """
+        :param embed: Maps images of shape (batch, 3, 100, 100) to embeddings, e.g. SiameseInference(model).embed.
+        It is only ever called from the worker thread.
+        :type embed: callable
+        :param max_batch_size: Requests per batch; a batch is flushed as soon as it is full. Defaults to 32
+        :type max_batch_size: int, optional
+        :param max_wait_ms: Longest time the first request of a batch waits for others. Defaults to 2.0
+        :type max_wait_ms: float, optional
+        :param max_latencies: Number of most recent request latencies kept. Defaults to 10 000
+        :type max_latencies: int, optional
+        """
+        self.embed = embed
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_wait = max_wait_ms / 1e3
+        self.latencies = deque(maxlen=max_latencies)
+        self._queue = None
+        self._collector = None
+        self._executor = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Clears the counters, e.g. after a warm-up."""
+        self.requests = 0
+        self.batches = 0
+        self.busy_s = 0.0
+        self.latencies.clear()
+        self._started = time.perf_counter()
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='siamese-worker')
+        self._collector = asyncio.create_task(self._collect())
+        self.reset_stats()
+
+    async def stop(self):
+        """Answers the requests already queued, then stops the collector and the worker thread."""
+        await self._queue.join()
+        self._collector.cancel()
+        try:
+            await self._collector
+        except asyncio.CancelledError:
+            pass
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def _submit(self, images: tuple):
+        future = asyncio.get_running_loop().create_future()
+        start = time.perf_counter()
+        self._queue.put_nowait((images, future))
+        result = await future
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+    async def score(self, img0, img1) -> float:
+        """Euclidean distance between the embeddings of two images, the quantity ContrastiveLoss is trained on.
+
+        :param img0: First image, shape (3, 100, 100).
+        :type img0: torch.Tensor
+        :param img1: Second image, shape (3, 100, 100).
+        :type img1: torch.Tensor
+        :return: The distance.
+        :rtype: float
+        """
+        return await self._submit((img0, img1))
+
+    async def embed_image(self, img) -> np.ndarray:
+        """Embedding of one image.
+
+        :param img: Image, shape (3, 100, 100).
+        :type img: torch.Tensor
+        :return: Embedding with shape (2,).
+        :rtype: np.ndarray
+        """
+        return await self._submit((img,))
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    # Still take whatever is already waiting, without yielding to the event loop
+                    while len(batch) < self.max_batch_size and not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Requests keep queuing up while the worker runs, so the next batch fills up as the load grows
+            try:
+                results = await loop.run_in_executor(self._executor, self._run, [images for images, _ in batch])
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+            else:
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            self.requests += len(batch)
+            self.batches += 1
+            for _ in batch:
+                self._queue.task_done()
+
+    def _run(self, requests: list) -> list:
+        start = time.perf_counter()
+        sizes = np.array([len(images) for images in requests])
+        # Row of the first image of every request in the stacked batch, and of the second one for pairs
+        firsts = torch.from_numpy(np.cumsum(sizes) - sizes)
+        seconds = firsts + torch.from_numpy(sizes == 2)
+        with torch.inference_mode():
+            embeddings = self.embed(torch.stack([img for images in requests for img in images])).float()
+            distances = F.pairwise_distance(embeddings[firsts], embeddings[seconds]).tolist()
+            firsts_embeddings = embeddings[firsts].numpy()
+        results = [
+            distance if size == 2 else embedding
+            for size, distance, embedding in zip(sizes.tolist(), distances, firsts_embeddings)
+        ]
+        self.busy_s += time.perf_counter() - start
+        return results
+
+    def stats(self) -> dict:
+        """Counters since start (or the last reset_stats).
+
+        :return: Dictionary with requests, batches, mean_batch_size, requests_per_s, worker_utilization (fraction of
+        the time spent in forward passes) and the latency percentiles of the requests (calls, p50_ms, p99_ms,
+        mean_ms).
+        :rtype: dict
+        """
+        elapsed = time.perf_counter() - self._started
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else None,
+            'requests_per_s': self.requests / elapsed if elapsed > 0 else None,
+            'worker_utilization': self.busy_s / elapsed if elapsed > 0 else None,
+            **latency_percentiles(self.latencies),
+        }
+
+
+async def generate_load(server: MicroBatchServer, rate: float, duration: float, pair_fraction: float = 1.0,
+                        seed: int = 0) -> dict:
+    """Sends requests to a running server at a given rate, with exponential gaps between arrivals (an open loop: a
+    slow server doesn't slow down the arrivals, its queue grows instead), and waits for all the answers.
+
+    :param server: A started server.
+    :type server: MicroBatchServer
+    :param rate: Mean number of requests per second.
+    :type rate: float
+    :param duration: Seconds during which requests are sent.
+    :type duration: float
+    :param pair_fraction: Fraction of pair requests, the others embed a single image. Defaults to 1.0
+    :type pair_fraction: float, optional
+    :param seed: Seed of the arrivals and the images. Defaults to 0
+    :type seed: int, optional
+    :return: server.stats() for the requests sent.
+    :rtype: dict
+    """
+    rng = np.random.default_rng(seed)
+    # A small pool of random images is enough: the network doesn't care what it is fed
+    images = torch.from_numpy(rng.random((16,) + IMAGE_SHAPE, dtype=np.float32))
+    loop = asyncio.get_running_loop()
+    server.reset_stats()
+    tasks = []
+    start = loop.time()
+    next_arrival = start
+    while next_arrival < start + duration:
+        delay = next_arrival - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        i, j = rng.integers(len(images), size=2)
+        if rng.random() < pair_fraction:
+            tasks.append(asyncio.create_task(server.score(images[i], images[j])))
+        else:
+            tasks.append(asyncio.create_task(server.embed_image(images[i])))
+        next_arrival += rng.exponential(1 / rate)
+    await asyncio.gather(*tasks)
+    return server.stats()
+
+
+async def sweep(embed, rate: float, duration: float, batch_sizes: list, waits: list, pair_fraction: float = 1.0,
+                seed: int = 0) -> list:
+    """Runs generate_load against a fresh server for every (max_batch_size, max_wait_ms) setting.
+
+    :param embed: See MicroBatchServer.
+    :type embed: callable
+    :param rate: Mean number of requests per second.
+    :type rate: float
+    :param duration: Seconds of load per setting.
+    :type duration: float
+    :param batch_sizes: max_batch_size values.
+    :type batch_sizes: list
+    :param waits: max_wait_ms values.
+    :type waits: list
+    :param pair_fraction: See generate_load. Defaults to 1.0
+    :type pair_fraction: float, optional
+    :param seed: See generate_load. Defaults to 0
+    :type seed: int, optional
+    :return: One dictionary per setting with max_batch_size, max_wait_ms, rate and the server's stats.
+    :rtype: list
+    """
+    results = []
+    for max_batch_size in batch_sizes:
+        for max_wait_ms in waits:
+            async with MicroBatchServer(embed, max_batch_size, max_wait_ms) as server:
+                # Warm-up, so that the first batches of every setting don't pay for lazy initializations
+                await generate_load(server, rate, min(duration, 0.5), pair_fraction, seed + 1)
+                stats = await generate_load(server, rate, duration, pair_fraction, seed)
+            results.append({'max_batch_size': max_batch_size, 'max_wait_ms': max_wait_ms, 'rate': rate, **stats})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=float, default=200.0, help='requests per second')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds of load per setting')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--waits', type=float, nargs='+', default=[0.0, 2.0, 5.0], help='max_wait_ms values')
+    parser.add_argument('--pair-fraction', type=float, default=1.0)
+    parser.add_argument('--no-freeze', action='store_true', help='serve the eager model instead of a frozen one')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    inference = SiameseInference(SiameseNetwork(), freeze=not args.no_freeze)
+    results = asyncio.run(sweep(
+        inference.embed, args.rate, args.duration, args.batch_sizes, args.waits, args.pair_fraction
+    ))
+    for row in results:
+        print(
+            f"N={row['max_batch_size']:>4}  T={row['max_wait_ms']:5.1f} ms  {row['requests_per_s']:8.1f} req/s"
+            f"  batch {row['mean_batch_size']:6.1f}  p50 {row['p50_ms']:8.2f} ms  p99 {row['p99_ms']:8.2f} ms"
+            f"  worker {100 * row['worker_utilization']:5.1f}%"
+        )
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,457 @@
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+
+
+def _unbroadcast(grad: np.ndarray, shape: tuple) -> np.ndarray:
+    """Sums a gradient back down to the shape of the array that was broadcast in the forward pass.
+
+    :param grad: Gradient with the (broadcast) shape of the output.
+    :type grad: np.ndarray
+    :param shape: Shape of the original operand.
+    :type shape: tuple
+    :return: Gradient with the shape of the original operand.
+    :rtype: np.ndarray
+    """
+    if grad.shape == shape:
+        return grad
+    # Remove the leading dimensions that broadcasting added
+    while grad.ndim > len(shape):
+        grad = grad.sum(axis=0)
+    # Sum over the dimensions that were stretched from size 1
+    for axis, size in enumerate(shape):
+        if size == 1 and grad.shape[axis] != 1:
+            grad = grad.sum(axis=axis, keepdims=True)
+    return grad
+
+
+def _noop():
+    pass
+
+
+def _reduced_axes(shape: tuple, ndim: int, axis) -> tuple:
+    """Axes of an array of the given shape that a reduction over axis, built on an ndim-dimensional input, sums over.
+    When a Tape is replayed on leaves with extra leading (batch) axes, as gradient_check does, those axes are kept out
+    of the reduction."""
+    lead = len(shape) - ndim
+    axes = range(ndim) if axis is None else np.atleast_1d(axis) % ndim
+    return tuple(lead + a for a in axes)
+
+def _reduce(reduce, data: np.ndarray, ndim: int, out_ndim: int, axis, keepdims: bool) -> np.ndarray:
+    """Applies reduce (np.sum or np.mean) to data like the reduction built on an ndim-dimensional input, padding the
+    result of a batched replay back so it still broadcasts like the input did."""
+    lead = data.ndim - ndim
+    if lead == 0:
+        return reduce(data, axis=axis, keepdims=keepdims)
+    reduced = reduce(data, axis=_reduced_axes(data.shape, ndim, axis), keepdims=keepdims)
+    return reduced.reshape(data.shape[:lead] + (1,) * (ndim - out_ndim) + reduced.shape[lead:])
+
+
+def build_topo(root: "Tensor") -> list:
+    """Orders the graph that ends in root topologically (children before parents). Uses an explicit stack instead of
+    recursion, so deep graphs don't hit Python's recursion limit.
+
+    :param root: Output node of the graph.
+    :type root: Tensor
+    :return: Every node of the graph, each one after all the nodes it was computed from.
+    :rtype: list
+    """
+    topo = []
+    visited = set()
+    stack = [(root, False)]
+    while stack:
+        v, children_done = stack.pop()
+        if children_done:
+            topo.append(v)
+            continue
+        if v in visited:
+            continue
+        visited.add(v)
+        stack.append((v, True))
+        for child in v._prev:
+            if child not in visited:
+                stack.append((child, False))
+    return topo
+
+
+class Tensor:
+    """Stores a NumPy array and its gradient. Same API shape as micrograd's Value (+, *, **, tanh, relu, .backward(),
+    .grad) but every node holds a whole array, so a layer is one node instead of thousands of scalar ones.
+    """
+
+    def __init__(self, data, _children=(), _op=''):
+        data = np.asarray(data)
+        # Complex data is kept complex: second_order pushes complex steps through the graph
+        self.data = data.astype(np.complex128 if np.iscomplexobj(data) else np.float64, copy=False)
+        self.grad = np.zeros_like(self.data)
+        # internal variables used for autograd graph construction
+        self._forward = _noop
+        self._backward = _noop
+        # optional split of _backward into (input, closure) pairs, each closure only writing the grad of its input
+        self._backward_parts = ()
+        self._prev = tuple(_children)
+        self._op = _op # the op that produced this node, for plotting / debugging
+
+    @property
+    def shape(self) -> tuple:
+        return self.data.shape
+
+    def __add__(self, other):
+        other = other if isinstance(other, Tensor) else Tensor(other)
+        out = Tensor(self.data + other.data, (self, other), '+')
+
+        def _forward():
+            out.data = self.data + other.data
+        out._forward = _forward
+
+        def _backward():
+            self.grad += _unbroadcast(out.grad, self.data.shape)
+            other.grad += _unbroadcast(out.grad, other.data.shape)
+        out._backward = _backward
+
+        return out
+
+    def __mul__(self, other):
+        other = other if isinstance(other, Tensor) else Tensor(other)
+        out = Tensor(self.data * other.data, (self, other), '*')
+
+        def _forward():
+            out.data = self.data * other.data
+        out._forward = _forward
+
+        def _backward():
+            self.grad += _unbroadcast(other.data * out.grad, self.data.shape)
+            other.grad += _unbroadcast(self.data * out.grad, other.data.shape)
+        out._backward = _backward
+
+        return out
+
+    def __pow__(self, other):
+        assert isinstance(other, (int, float)), "only supporting int/float powers for now"
+        out = Tensor(self.data**other, (self,), f'**{other}')
+
+        def _forward():
+            out.data = self.data**other
+        out._forward = _forward
+
+        def _backward():
+            self.grad += (other * self.data**(other - 1)) * out.grad
+        out._backward = _backward
+
+        return out
+
+    def __matmul__(self, other):
+        other = other if isinstance(other, Tensor) else Tensor(other)
+        out = Tensor(self.data @ other.data, (self, other), '@')
+
+        def _forward():
+            out.data = self.data @ other.data
+        out._forward = _forward
+
+        def _backward_input():
+            self.grad += out.grad @ other.data.T
+        def _backward_weight():
+            other.grad += self.data.T @ out.grad
+        def _backward():
+            _backward_input()
+            _backward_weight()
+        out._backward = _backward
+        # The two products are independent, so a parallel backward can compute the weight gradient of a layer while
+        # the input gradient moves on to the layer below
+        out._backward_parts = ((self, _backward_input), (other, _backward_weight))
+
+        return out
+
+    def tanh(self):
+        out = Tensor(np.tanh(self.data), (self,), 'tanh')
+
+        def _forward():
+            out.data = np.tanh(self.data)
+        out._forward = _forward
+
+        def _backward():
+            self.grad += (1 - out.data**2) * out.grad
+        out._backward = _backward
+
+        return out
+
+    def relu(self):
+        # The mask looks at the real part only, so that complex steps go through the same branch as the real value
+        out = Tensor(np.where(self.data.real > 0, self.data, 0), (self,), 'ReLU')
+
+        def _forward():
+            out.data = np.where(self.data.real > 0, self.data, 0)
+        out._forward = _forward
+
+        def _backward():
+            self.grad += (self.data.real > 0) * out.grad
+        out._backward = _backward
+
+        return out
+
+    def exp(self):
+        out = Tensor(np.exp(self.data), (self,), 'exp')
+
+        def _forward():
+            out.data = np.exp(self.data)
+        out._forward = _forward
+
+        def _backward():
+            self.grad += out.data * out.grad
+        out._backward = _backward
+
+        return out
+
+    def log(self):
+        out = Tensor(np.log(self.data), (self,), 'log')
+
+        def _forward():
+            out.data = np.log(self.data)
+        out._forward = _forward
+
+        def _backward():
+            self.grad += out.grad / self.data
+        out._backward = _backward
+
+        return out
+
+    def sum(self, axis=None, keepdims=False):
+        out = Tensor(self.data.sum(axis=axis, keepdims=keepdims), (self,), 'sum')
+        ndim, out_ndim = self.data.ndim, out.data.ndim
+
+        def _forward():
+            out.data = _reduce(np.sum, self.data, ndim, out_ndim, axis, keepdims)
+        out._forward = _forward
+
+        def _backward():
+            grad = out.grad
+            if axis is not None and not keepdims:
+                grad = np.expand_dims(grad, axis)
+            self.grad += np.broadcast_to(grad, self.data.shape)
+        out._backward = _backward
+
+        return out
+
+    def mean(self, axis=None, keepdims=False):
+        out = Tensor(self.data.mean(axis=axis, keepdims=keepdims), (self,), 'mean')
+        ndim, out_ndim = self.data.ndim, out.data.ndim
+
+        def _forward():
+            out.data = _reduce(np.mean, self.data, ndim, out_ndim, axis, keepdims)
+        out._forward = _forward
+
+        def _backward():
+            # The number of averaged elements is read from the current input, so that a Tape replayed on leaves with
+            # another batch size still averages over the right count
+            count = np.prod([self.data.shape[a] for a in _reduced_axes(self.data.shape, ndim, axis)])
+            grad = out.grad
+            if axis is not None and not keepdims:
+                grad = np.expand_dims(grad, axis)
+            self.grad += np.broadcast_to(grad, self.data.shape) / count
+        out._backward = _backward
+
+        return out
+
+    def backward(self, retain_graph: bool = True, workers: int = None):
+        """Backpropagates from this node, accumulating into the .grad of every node of the graph.
+
+        :param retain_graph: If False, every intermediate node drops its gradient, its parents and its closures as soon
+        as its gradient has been propagated, so the graph is freed during the backward pass instead of waiting for the
+        garbage collector (each node and its closures form a reference cycle). Leaves keep their data and gradients.
+        Defaults to True
+        :type retain_graph: bool, optional
+        :param workers: If given, independent parts of the graph are backpropagated concurrently on a pool of this many
+        threads (see parallel_backward). Defaults to None (serial)
+        :type workers: int, optional
+        """
+
+        # topological order all of the children in the graph
+        topo = build_topo(self)
+
+        # go one node at a time and apply the chain rule to get its gradient
+        self.grad = np.ones_like(self.data)
+        if workers is not None:
+            parallel_backward(topo, workers)
+            if not retain_graph:
+                for v in topo:
+                    if v._prev:
+                        v._release()
+                        if v is not self:
+                            v.grad = None
+            return
+
+        if retain_graph:
+            for v in reversed(topo):
+                v._backward()
+            return
+
+        while topo:
+            v = topo.pop()
+            v._backward()
+            if v._prev:
+                v._release()
+                if v is not self:
+                    v.grad = None
+
+    def _release(self):
+        self._prev = ()
+        self._forward = _noop
+        self._backward = _noop
+        self._backward_parts = ()
+
+    def release_graph(self):
+        """Detaches every node of the graph that ends here from its parents and closures, keeping data and gradients.
+        Use it to drop a graph that was built with retain_graph=True (or replayed with a Tape) once it is not needed.
+        """
+        for v in build_topo(self):
+            if v._prev:
+                v._release()
+
+    def zero_grad(self):
+        self.grad = np.zeros_like(self.data)
+
+    def __neg__(self): # -self
+        return self * -1
+
+    def __radd__(self, other): # other + self
+        return self + other
+
+    def __sub__(self, other): # self - other
+        return self + (-other)
+
+    def __rsub__(self, other): # other - self
+        return other + (-self)
+
+    def __rmul__(self, other): # other * self
+        return self * other
+
+    def __rmatmul__(self, other): # other @ self
+        return Tensor(other) @ self
+
+    def __truediv__(self, other): # self / other
+        return self * other**-1
+
+    def __rtruediv__(self, other): # other / self
+        return other * self**-1
+
+    def __repr__(self):
+        return f"Tensor(data={self.data}, grad={self.grad})"
+
+
+class Tape:
+    """Flat record of a graph in topological order. The graph is walked once when the tape is built; afterwards
+    forward() and backward() just loop over the recorded nodes. Change the .data of the leaves (new inputs or
+    updated parameters) and replay the tape instead of rebuilding and re-sorting the graph on every rerun.
+    """
+
+    def __init__(self, root: Tensor):
+        self.root = root
+        self.nodes = build_topo(root)
+
+    def forward(self) -> Tensor:
+        """Recomputes every node from the current data of the leaves.
+
+        :return: The root of the tape, holding the new output.
+        :rtype: Tensor
+        """
+        for v in self.nodes:
+            v._forward()
+        return self.root
+
+    def backward(self, workers: int = None):
+        """Resets the gradients of every node on the tape and backpropagates from the root.
+
+        :param workers: If given, backpropagate on a pool of this many threads (see parallel_backward). Defaults to
+        None (serial)
+        :type workers: int, optional
+        """
+        # Gradients take the dtype of the output, so that a complex step on any leaf reaches real constants too
+        dtype = self.root.data.dtype
+        for v in self.nodes:
+            v.grad = np.zeros(v.data.shape, dtype=dtype)
+        self.root.grad = np.ones_like(self.root.data)
+        if workers is not None:
+            parallel_backward(self.nodes, workers)
+            return
+        for v in reversed(self.nodes):
+            v._backward()
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+# One pool per number of threads, created once (under the lock, backward passes may run from several threads) and
+# shut down at exit
+_thread_pools = {}
+_thread_pools_lock = threading.Lock()
+
+@atexit.register
+def _shutdown_thread_pools():
+    with _thread_pools_lock:
+        for pool in _thread_pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pools.clear()
+
+def parallel_backward(topo: list, workers: int):
+    """Runs the backward closures of a topologically sorted graph on a thread pool. NumPy releases the GIL inside
+    matmuls and ufuncs, so independent branches (the weight gradient of every layer, the terms of a loss, the two
+    towers of a siamese network...) really run at the same time.
+
+    Scheduling uses dependency counting: a task (a node's _backward, or one of its _backward_parts) becomes ready
+    once every task that writes into that node's grad has finished. Two tasks that write into the grad of the same
+    node never run at the same time, so no locks are needed around the accumulations. The order in which gradients
+    are summed can change from run to run, so results can differ from the serial pass in the last bits.
+
+    The gradient of the root has to be set before calling it.
+
+    :param topo: Nodes of the graph in topological order (the output last), as returned by build_topo.
+    :type topo: list
+    :param workers: Number of threads.
+    :type workers: int
+    """
+    with _thread_pools_lock:
+        if workers not in _thread_pools:
+            _thread_pools[workers] = ThreadPoolExecutor(max_workers=workers)
+        pool = _thread_pools[workers]
+
+    # One task per node, or one per input for nodes that split their backward
+    tasks = {}
+    for v in topo:
+        if not v._prev:
+            continue
+        if v._backward_parts:
+            tasks[v] = [((target,), fn) for target, fn in v._backward_parts]
+        else:
+            tasks[v] = [(tuple(set(v._prev)), v._backward)]
+
+    # Number of tasks still to write into each node's grad
+    writers_left = dict.fromkeys(topo, 0)
+    for node_tasks in tasks.values():
+        for targets, _ in node_tasks:
+            for target in targets:
+                writers_left[target] += 1
+
+    ready = [task for v in topo if writers_left[v] == 0 and v in tasks for task in tasks[v]]
+    busy = set()
+    running = {}
+    while ready or running:
+        deferred = []
+        for task in ready:
+            targets, fn = task
+            if busy.intersection(targets):
+                deferred.append(task)
+                continue
+            busy.update(targets)
+            running[pool.submit(fn)] = targets
+        ready = deferred
+
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            targets = running.pop(future)
+            future.result()
+            busy.difference_update(targets)
+            for target in targets:
+                writers_left[target] -= 1
+                if writers_left[target] == 0 and target in tasks:
+                    ready.extend(tasks[target])
@@ -0,0 +1,57 @@
+import numpy as np
+from tensor_engine import Tensor
+
+class Module:
+
+    def zero_grad(self):
+        for p in self.parameters():
+            p.zero_grad()
+
+    def parameters(self):
+        return []
+
+class Layer(Module):
+    """Fully connected layer. Holds the weights of all its neurons in a single (nin, nout) matrix, so a whole
+    minibatch goes through the layer with one matrix multiplication.
+    """
+
+    def __init__(self, nin: int, nout: int, nonlin: str = 'relu', rng: np.random.Generator = None):
+        rng = rng if rng is not None else np.random.default_rng()
+        self.W = Tensor(rng.uniform(-1, 1, (nin, nout)) / np.sqrt(nin))
+        self.b = Tensor(np.zeros((1, nout)))
+        self.nonlin = nonlin
+
+    def __call__(self, x):
+        act = x @ self.W + self.b
+        if self.nonlin == 'relu':
+            return act.relu()
+        if self.nonlin == 'tanh':
+            return act.tanh()
+        return act
+
+    def parameters(self):
+        return [self.W, self.b]
+
+    def __repr__(self):
+        return f"{self.nonlin or 'linear'}Layer({self.W.shape[0]}, {self.W.shape[1]})"
+
+class MLP(Module):
+
+    def __init__(self, nin: int, nouts: list, nonlin: str = 'relu', rng: np.random.Generator = None):
+        rng = rng if rng is not None else np.random.default_rng()
+        sz = [nin] + nouts
+        self.layers = [
+            Layer(sz[i], sz[i+1], nonlin=nonlin if i != len(nouts)-1 else None, rng=rng) for i in range(len(nouts))
+        ]
+
+    def __call__(self, x):
+        x = x if isinstance(x, Tensor) else Tensor(x)
+        for layer in self.layers:
+            x = layer(x)
+        return x
+
+    def parameters(self):
+        return [p for layer in self.layers for p in layer.parameters()]
+
+    def __repr__(self):
+        return f"MLP of [{', '.join(str(layer) for layer in self.layers)}]"
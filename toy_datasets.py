@@ -0,0 +1,31 @@
+import numpy as np
+
+
+def make_moons(n_samples: int = 100, noise: float = 0.1, rng: np.random.Generator = None) -> tuple:
+    """Generates two interleaving half circles, the 2-D dataset used in the micrograd demo. Same construction as
+    sklearn.datasets.make_moons, without the dependency.
+
+    :param n_samples: Total number of points. Defaults to 100
+    :type n_samples: int, optional
+    :param noise: Standard deviation of the gaussian noise added to the points. Defaults to 0.1
+    :type noise: float, optional
+    :param rng: Random generator. Defaults to None (a fresh default_rng)
+    :type rng: np.random.Generator, optional
+    :return: Tuple (X, y) with X of shape (n_samples, 2) and labels y in {-1, 1} of shape (n_samples,).
+    :rtype: tuple
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    n_out = n_samples // 2
+    n_in = n_samples - n_out
+
+    outer = np.linspace(0, np.pi, n_out)
+    inner = np.linspace(0, np.pi, n_in)
+    X = np.concatenate([
+        np.stack([np.cos(outer), np.sin(outer)], axis=1),
+        np.stack([1 - np.cos(inner), 1 - np.sin(inner) - 0.5], axis=1),
+    ])
+    y = np.concatenate([-np.ones(n_out), np.ones(n_in)])
+
+    X += rng.normal(scale=noise, size=X.shape)
+    order = rng.permutation(n_samples)
+    return X[order], y[order]